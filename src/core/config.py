@@ -20,6 +20,8 @@ class LLMConfig(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 4096
     timeout: int = 60
+    # 主模型失败时切换的自定义LLM提供商ID（providers.llm 中的 id），默认不启用故障切换
+    fallback_providers: List[str] = Field(default_factory=list)
 
 
 class ImageConfig(BaseModel):
@@ -292,6 +294,10 @@ class Settings(BaseSettings):
     # 接口AI特殊配置
     jiekouai_base_url: str = Field("https://api.jiekou.ai", alias="JIEKOUAI_BASE_URL")
     jiekouai_endpoint: str = Field("/v3/nano-banana-pro-light-t2i", alias="JIEKOUAI_ENDPOINT")
+    jiekouai_http2: bool = Field(False, alias="JIEKOUAI_HTTP2")  # 图片生成请求走 HTTP/2（需安装 h2）
+    
+    # LLM响应缓存：剧本解析/概要等请求完全相同时复用上次的响应，避免重复计费
+    llm_response_cache: bool = Field(False, alias="LLM_RESPONSE_CACHE")
     
     def get_api_key(self, provider: str) -> Optional[str]:
         """获取指定提供商的API密钥"""
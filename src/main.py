@@ -36,9 +36,11 @@ from src.core.config import Config, settings
 from src.core.project_manager import ProjectManager
 from src.core.task_queue import get_queue, shutdown_all_queues, TaskPriority
 from src.models.schemas import Project, Character, Scene, Shot, TaskStatus, ImagePrompt
-from src.services.llm_service import LLMService
+from src.services.llm_service import LLMService, get_llm_service
 from src.services.image_service import ImageService
+from src.services.jiekouai_service import JiekouAIImageService
 from src.services.video import VideoService
+from src.services.video.providers.base import BaseVideoProvider
 from src.services.shot_design_service import ShotDesignService
 from src.services.video_monitor import get_video_monitor
 from src.services.batch_pipeline import get_batch_pipeline_service, BatchJob, BatchTaskStatus
@@ -71,6 +73,10 @@ async def lifespan(app: FastAPI):
     batch_pipeline = get_batch_pipeline_service()
     await batch_pipeline.start()
     
+    # 预热 jiekou.ai 连接（DNS解析 + TLS握手），后台执行不阻塞启动
+    warmup_service = ImageService().jiekouai_service
+    warmup_task = asyncio.create_task(warmup_service.warmup()) if warmup_service else None
+    
     # 恢复僵尸任务
     for project in project_manager.list_projects():
         recovered = project_manager.recover_zombie_tasks(project, timeout_seconds=300)
@@ -91,6 +97,19 @@ async def lifespan(app: FastAPI):
     await video_monitor.stop()
     
     await shutdown_all_queues()
+    
+    # 关闭 jiekou.ai 共享连接池
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if warmup_service:
+        await warmup_service.close()
+    await JiekouAIImageService.shutdown()
+    
+    # 释放LLM路由器缓存
+    await LLMService.shutdown()
+    
+    # 关闭视频提供商共享连接池
+    await BaseVideoProvider.shutdown()
 
 
 app = FastAPI(
@@ -246,13 +265,14 @@ async def parse_script(project_id: str, background_tasks: BackgroundTasks):
             print(f"📖 剧本长度: {len(script)} 字符")
             
             # 使用LLM解析
-            llm_service = LLMService()
+            llm_service = get_llm_service()
             print(f"🤖 LLM服务初始化完成，使用模型: {llm_service.llm_config.model}")
             
-            # 提取角色
-            print("🔍 提取角色...")
-            characters_data = await llm_service.extract_characters(script)
+            # 一次LLM调用提取角色和场景
+            print("🔍 提取角色和场景...")
+            characters_data, scenes_data = await llm_service.extract_all(script)
             print(f"✅ 提取到 {len(characters_data)} 个角色")
+            print(f"✅ 提取到 {len(scenes_data)} 个场景")
             
             characters = [
                 Character(
@@ -266,11 +286,6 @@ async def parse_script(project_id: str, background_tasks: BackgroundTasks):
             project_manager.save_characters(project, characters)
             print(f"💾 角色保存完成: {len(characters)} 个")
             
-            # 提取场景
-            print("🔍 提取场景...")
-            scenes_data = await llm_service.extract_scenes(script)
-            print(f"✅ 提取到 {len(scenes_data)} 个场景")
-            
             scenes = [
                 Scene(
                     scene_id=f"scene_{i+1:03d}",
@@ -384,41 +399,52 @@ async def generate_references(project_id: str):
     characters = project_manager.load_characters(project)
     scenes = project_manager.load_scenes(project)
     
-    image_queue = get_queue("image")
-    
-    # 提交角色参考图生成任务
-    for char in characters:
-        async def gen_char_ref(c=char):
-            image_service = ImageService()
-            # 不带扩展名，让服务自动检测
-            output_path = Path(project.root_path) / "02_references" / "characters" / c.character_id
-            success = await image_service.generate_character_reference(
-                c, project.style_description, output_path
-            )
-            if success:
-                project_manager.update_character(project, c)
+    async def prepare_and_submit():
+        # 先并发生成全部提示词，图片队列的worker不再被逐个等待LLM占用
+        llm_service = get_llm_service()
+        char_prompts, scene_prompts = await asyncio.gather(
+            llm_service.generate_character_prompts_batch(characters, project.style_description),
+            llm_service.generate_scene_prompts_batch(scenes, project.style_description)
+        )
         
-        await image_queue.submit(gen_char_ref, priority=TaskPriority.NORMAL)
-    
-    # 提交场景参考图生成任务
-    for scene in scenes:
-        async def gen_scene_ref(s=scene):
-            image_service = ImageService()
-            # 不带扩展名，让服务自动检测
-            output_path = Path(project.root_path) / "02_references" / "scenes" / s.scene_id
-            success = await image_service.generate_scene_reference(
-                s, project.style_description, output_path
-            )
-            if success:
-                # 保存场景
-                scenes_list = project_manager.load_scenes(project)
-                for i, sc in enumerate(scenes_list):
-                    if sc.scene_id == s.scene_id:
-                        scenes_list[i] = s
-                        break
-                project_manager.save_scenes(project, scenes_list)
+        image_queue = get_queue("image")
+        
+        # 提交角色参考图生成任务（提示词生成失败的项在任务内重新生成）
+        for char, prompt in zip(characters, char_prompts):
+            async def gen_char_ref(c=char, p=None if isinstance(prompt, Exception) else prompt):
+                image_service = ImageService()
+                # 不带扩展名，让服务自动检测
+                output_path = Path(project.root_path) / "02_references" / "characters" / c.character_id
+                success = await image_service.generate_character_reference(
+                    c, project.style_description, output_path, prompt=p
+                )
+                if success:
+                    project_manager.update_character(project, c)
+            
+            await image_queue.submit(gen_char_ref, priority=TaskPriority.NORMAL)
         
-        await image_queue.submit(gen_scene_ref, priority=TaskPriority.NORMAL)
+        # 提交场景参考图生成任务
+        for scene, prompt in zip(scenes, scene_prompts):
+            async def gen_scene_ref(s=scene, p=None if isinstance(prompt, Exception) else prompt):
+                image_service = ImageService()
+                # 不带扩展名，让服务自动检测
+                output_path = Path(project.root_path) / "02_references" / "scenes" / s.scene_id
+                success = await image_service.generate_scene_reference(
+                    s, project.style_description, output_path, prompt=p
+                )
+                if success:
+                    # 保存场景
+                    scenes_list = project_manager.load_scenes(project)
+                    for i, sc in enumerate(scenes_list):
+                        if sc.scene_id == s.scene_id:
+                            scenes_list[i] = s
+                            break
+                    project_manager.save_scenes(project, scenes_list)
+            
+            await image_queue.submit(gen_scene_ref, priority=TaskPriority.NORMAL)
+    
+    llm_queue = get_queue("llm")
+    await llm_queue.submit(prepare_and_submit, priority=TaskPriority.NORMAL)
     
     return {
         "status": "generating",
@@ -506,12 +532,17 @@ async def design_shots(project_id: str, request: DesignShotsRequest):
     
     llm_queue = get_queue("llm")
     
+    # 已有分镜时属于重新设计，不复用缓存的LLM响应
+    redesign = bool(project_manager.load_shots(project))
+    
     async def do_design():
         shot_design_service = ShotDesignService()
         all_shots = []
         
         # 建立角色名到角色对象的映射
         char_name_map = {c.name: c for c in characters}
+        characters_by_scene = {}
+        segments = {}
         
         for scene in scenes:
             # 正确获取场景中的角色（通过角色名称匹配）
@@ -525,21 +556,19 @@ async def design_shots(project_id: str, request: DesignShotsRequest):
                 scene_chars = characters
                 print(f"⚠️ 场景 {scene.scene_id} 没有角色名称列表，使用所有角色")
             
-            # 获取剧本片段：优先使用场景保存的剧本片段（从剧本解析获得）
-            script_segment = scene.script_segment if scene.script_segment else _extract_scene_script(script, scene.name)
-            
-            # 生成分镜
-            shots = await shot_design_service.design_shots_for_scene(
-                scene, scene_chars, project.style_description, script_segment
-            )
-            
-            # 为每个分镜生成提示词
-            for shot in shots:
-                shot = await shot_design_service.generate_shot_prompts(
-                    shot, scene_chars, scene, project.style_description
-                )
-                all_shots.append(shot)
+            characters_by_scene[scene.scene_id] = scene_chars
             
+            # 获取剧本片段：优先使用场景保存的剧本片段（从剧本解析获得）
+            segments[scene.scene_id] = scene.script_segment if scene.script_segment else _extract_scene_script(script, scene.name)
+        
+        # 并发生成各场景的分镜及其提示词
+        shots_per_scene = await shot_design_service.design_all_scenes(
+            scenes, characters_by_scene, project.style_description, segments,
+            use_cache=not redesign
+        )
+        
+        for scene, shots in zip(scenes, shots_per_scene):
+            all_shots.extend(shots)
             # 更新场景的shots列表
             scene.shots = [s.shot_id for s in shots]
         
@@ -726,8 +755,9 @@ async def redesign_shot(project_id: str, shot_id: str, request: RegenerateReques
                 
                 # 重新生成提示词
                 shot_design_service = ShotDesignService()
-                shot = await shot_design_service.generate_shot_prompts(
-                    shot, shot_characters, scene, project.style_description
+                # generate_shot_prompts 原地更新分镜；不重新绑定 shot，否则它在闭包内成为局部变量
+                await shot_design_service.generate_shot_prompts(
+                    shot, shot_characters, scene, project.style_description, use_cache=False
                 )
                 
                 # 保存
@@ -1198,6 +1228,10 @@ async def check_video_status(project_id: str, shot_id: str):
                 video_service = VideoService(video_config)
                 
                 try:
+                    output_dir = Path(project.root_path) / "04_videos"
+                    # 已完成待下载的视频: (video, url, 本地路径)，状态查询完后统一并发下载
+                    to_download = []
+                    
                     for video in batch["videos"]:
                         if video.get("status") in ["submitted", "processing"] and video.get("task_id"):
                             try:
@@ -1212,21 +1246,23 @@ async def check_video_status(project_id: str, shot_id: str):
                                 if result.error_message:
                                     video["error"] = result.error_message
                                 
-                                # 如果已完成，下载视频
+                                # 如果已完成，加入下载列表
                                 if result.status == "completed" and result.video_url:
-                                    output_dir = Path(project.root_path) / "04_videos"
-                                    output_dir.mkdir(exist_ok=True)
                                     output_path = output_dir / f"{shot_id}_{video.get('task_id', 'unknown')[:8]}.mp4"
-                                    
-                                    success = await video_service.download_video(
-                                        result.video_url, str(output_path)
-                                    )
-                                    if success:
-                                        video["local_path"] = str(output_path)
-                                        shot.status = "completed"
+                                    to_download.append((video, result.video_url, str(output_path)))
                             except Exception as e:
                                 video["error"] = str(e)
                     
+                    if to_download:
+                        output_dir.mkdir(exist_ok=True)
+                        results = await video_service.download_videos(
+                            [(url, path) for _, url, path in to_download]
+                        )
+                        for (video, _, path), success in zip(to_download, results):
+                            if success:
+                                video["local_path"] = path
+                                shot.status = "completed"
+                    
                     project_manager.update_shot(project, shot)
                     return {"shot_id": shot_id, "videos": batch["videos"]}
                 finally:
@@ -1381,7 +1417,7 @@ async def generate_video_prompt_endpoint(project_id: str, shot_id: str, request:
             
             # 调用LLM生成视频Prompt
             try:
-                llm_service = LLMService()
+                llm_service = get_llm_service()
                 response = await llm_service.generate(filled_prompt)
                 
                 # 解析响应
@@ -1826,16 +1862,18 @@ async def regenerate_character(project_id: str, character_id: str, request: Rege
                 )
                 
                 try:
+                    actual_path = None
                     if result.get("success") and result.get("url"):
                         # 下载图片，自动检测扩展名
                         actual_path = await service._download_image_with_ext(result["url"], output_path)
+                    if actual_path:
                         version.path = str(actual_path)
                         version.status = "pending_review"
                         project_manager.save_characters(project, characters)
                         print(f"✅ 角色 {char.name} 重新生成完成")
                     else:
                         version.status = "failed"
-                        version.rejected_reason = result.get("error", "未知错误")
+                        version.rejected_reason = result.get("error") or "图片下载失败"
                         project_manager.save_characters(project, characters)
                         print(f"❌ 角色 {char.name} 重新生成失败: {result.get('error')}")
                 finally:
@@ -1912,16 +1950,18 @@ async def regenerate_scene(project_id: str, scene_id: str, request: RegenerateRe
                 )
                 
                 try:
+                    actual_path = None
                     if result.get("success") and result.get("url"):
                         # 下载图片，自动检测扩展名
                         actual_path = await service._download_image_with_ext(result["url"], output_path)
+                    if actual_path:
                         version.path = str(actual_path)
                         version.status = "pending_review"
                         project_manager.save_scenes(project, scenes)
                         print(f"✅ 场景 {scene.name} 重新生成完成")
                     else:
                         version.status = "failed"
-                        version.rejected_reason = result.get("error", "未知错误")
+                        version.rejected_reason = result.get("error") or "图片下载失败"
                         project_manager.save_scenes(project, scenes)
                         print(f"❌ 场景 {scene.name} 重新生成失败: {result.get('error')}")
                 finally:
@@ -11,7 +11,7 @@ from datetime import datetime
 
 from src.core.config import Config, settings
 from src.models.schemas import Character, Scene, Shot, ImagePrompt
-from src.services.jiekouai_service import JiekouAIImageService
+from src.services.jiekouai_service import JiekouAIImageService, stream_response_to_file
 
 
 class ImageService:
@@ -29,7 +29,9 @@ class ImageService:
             self.jiekouai_service = JiekouAIImageService(
                 api_key=self.api_key or "",
                 base_url=getattr(settings, 'jiekouai_base_url', "https://api.jiekou.ai"),
-                endpoint=getattr(settings, 'jiekouai_endpoint', "/v3/nano-banana-pro-light-t2i")
+                endpoint=getattr(settings, 'jiekouai_endpoint', "/v3/nano-banana-pro-light-t2i"),
+                max_concurrency=self.config.defaults.concurrency.image_workers,
+                use_http2=settings.jiekouai_http2
             )
     
     async def _get_session(self) -> aiohttp.ClientSession:
@@ -121,7 +123,8 @@ class ImageService:
         self,
         character: Character,
         style_description: str,
-        output_path: Path
+        output_path: Path,
+        prompt: Optional[str] = None
     ) -> bool:
         """
         生成角色参考图
@@ -130,15 +133,17 @@ class ImageService:
             character: 角色对象
             style_description: 风格描述
             output_path: 输出路径
+            prompt: 预先生成的提示词，为空时调用LLM生成
         
         Returns:
             是否成功
         """
-        from src.services.llm_service import LLMService
-        
         # 生成提示词
-        llm_service = LLMService(self.config)
-        prompt = await llm_service.generate_character_prompt(character, style_description)
+        if not prompt:
+            from src.services.llm_service import LLMService
+            
+            llm_service = LLMService(self.config)
+            prompt = await llm_service.generate_character_prompt(character, style_description)
         
         # 检查提示词长度
         full_prompt = f"{prompt}, {style_description}, high quality, detailed"
@@ -193,7 +198,8 @@ class ImageService:
         scene: Scene,
         style_description: str,
         output_path: Path,
-        reference_image_url: Optional[str] = None
+        reference_image_url: Optional[str] = None,
+        prompt: Optional[str] = None
     ) -> bool:
         """
         生成场景参考图
@@ -203,14 +209,16 @@ class ImageService:
             style_description: 风格描述
             output_path: 输出路径
             reference_image_url: 可选的参考图片URL (用于i2i生成)
+            prompt: 预先生成的提示词，为空时调用LLM生成
         
         Returns:
             是否成功
         """
-        from src.services.llm_service import LLMService
-        
-        llm_service = LLMService(self.config)
-        prompt = await llm_service.generate_scene_prompt(scene, style_description)
+        if not prompt:
+            from src.services.llm_service import LLMService
+            
+            llm_service = LLMService(self.config)
+            prompt = await llm_service.generate_scene_prompt(scene, style_description)
         
         # 检查提示词长度
         full_prompt = f"{prompt}, {style_description}, high quality, detailed"
@@ -348,8 +356,7 @@ class ImageService:
         async with session.get(url) as response:
             if response.status == 200:
                 output_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(output_path, 'wb') as f:
-                    f.write(await response.read())
+                await stream_response_to_file(response, output_path)
     
     async def regenerate_with_seed(
         self,
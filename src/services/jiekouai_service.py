@@ -5,13 +5,189 @@ API文档: https://api.jiekou.ai/v3/nano-banana-pro-light-t2i
 
 import aiohttp
 import asyncio
-import base64
+import atexit
+import concurrent.futures
+import functools
+import httpx
 import io
-from typing import Optional, Dict, Any, List
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import urlparse
 from PIL import Image
 
+# 可选依赖：pybase64 提供 SIMD 加速且与标准库接口一致的 base64 编码，
+# 并可直接输出 str，省去 bytes -> str 的一次完整拷贝
+try:
+    import pybase64 as base64
+    
+    _b64encode_str = base64.b64encode_as_string
+except ImportError:
+    import base64
+    
+    def _b64encode_str(data: bytes) -> str:
+        # base64 输出只含ASCII字符，ascii 解码走C快速路径
+        return base64.b64encode(data).decode('ascii')
+
+# 可选依赖：orjson 的序列化/反序列化比标准库 json 快数倍，未安装时回退到 json
+# 请求体直接序列化为UTF-8字节发送，省去 str -> bytes 的再编码
+try:
+    import orjson
+    
+    _json_dumps_bytes = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    
+    _json_loads = json.loads
+
+# 可选依赖：aiofiles 把磁盘写入放到线程池，慢速磁盘（网络盘、WSL）不会阻塞事件循环
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+# 可选依赖：aiodns (c-ares) 非阻塞DNS解析，未安装时使用 aiohttp 默认的线程池 getaddrinfo
+try:
+    import aiodns  # noqa: F401
+    from aiohttp.resolver import AsyncResolver
+except ImportError:
+    AsyncResolver = None
+
+# 可选依赖：OpenCV 的 INTER_AREA 缩放比 Pillow LANCZOS 快数倍，未安装时回退到 Pillow
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+# 可选依赖：PyTurboJPEG 直接调用 libjpeg-turbo 的 SIMD 编码器，比 Pillow 的 JPEG 编码更快
+try:
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError):
+    # OSError: 已安装 PyTurboJPEG 但找不到 libturbojpeg 动态库
+    _turbo_jpeg = None
+
+logger = logging.getLogger(__name__)
+
+# 参考图压缩（PIL释放GIL）使用的进程级线程池，避免每次调用创建/销毁线程
+_COMPRESS_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=min(8, os.cpu_count() or 4),
+    thread_name_prefix="jiekou-img"
+)
+atexit.register(_COMPRESS_EXECUTOR.shutdown, wait=False)
+
+
+def _make_jpeg_encoder(img: Image.Image):
+    """
+    返回将 img 编码为 4:2:0 采样JPEG字节的函数 encode(quality, optimize=False)
+    
+    同一张图反复试探质量时复用中间对象：libjpeg-turbo 路径只做一次像素数组转换，
+    PIL 路径复用同一个 BytesIO 缓冲区，避免每次编码重新分配。
+    """
+    if _turbo_jpeg is not None and img.mode == 'RGB':
+        pixels = np.asarray(img)
+        return lambda quality, optimize=False: _turbo_jpeg.encode(
+            pixels, quality=quality, pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420
+        )
+    
+    buffer = io.BytesIO()
+    
+    def encode(quality: int, optimize: bool = False) -> bytes:
+        buffer.seek(0)
+        img.save(buffer, format='JPEG', quality=quality, optimize=optimize, subsampling=2)
+        buffer.truncate()
+        return buffer.getvalue()
+    
+    return encode
+
+
+def _encode_jpeg(img: Image.Image, quality: int, optimize: bool = False) -> bytes:
+    """将图片编码为 4:2:0 采样的JPEG字节（RGB图片优先使用 libjpeg-turbo）"""
+    return _make_jpeg_encoder(img)(quality, optimize)
+
+
+def _make_downscaler(img: Image.Image):
+    """返回按目标尺寸缩小 img 的函数（使用 OpenCV 时只做一次数组转换）"""
+    if cv2 is None:
+        half = None
+        
+        def downscale(size):
+            # 目标不超过原图一半时，先用 reduce(2)（整数倍盒式缩小，不走滤波核）得到半尺寸底图，
+            # 再用 LANCZOS 缩放到目标尺寸；底图只计算一次，供后续各档缩放复用
+            nonlocal half
+            if size[0] * 2 <= img.width and size[1] * 2 <= img.height:
+                if half is None:
+                    half = img.reduce(2)
+                return half.resize(size, Image.Resampling.LANCZOS)
+            return img.resize(size, Image.Resampling.LANCZOS)
+        
+        return downscale
+    
+    pixels = np.asarray(img)
+    return lambda size: Image.fromarray(cv2.resize(pixels, size, interpolation=cv2.INTER_AREA))
+
+
+# aiofiles 写入时每批的最小字节数
+WRITE_BATCH_SIZE = 256 * 1024
+
+
+async def stream_response_to_file(response: aiohttp.ClientResponse, path: Path) -> int:
+    """
+    将响应体边接收边写入文件，避免整个文件先读入内存
+    
+    使用 iter_any() 直接写出网络缓冲区中已到达的数据块，不再按固定大小切分拷贝。
+    安装了 aiofiles 时写入在线程池中进行，数据块先攒到 WRITE_BATCH_SIZE 再写，
+    减少线程切换次数。
+    传输中途失败（超时、连接断开、取消）时删除不完整的文件，调用方可以用
+    path.exists() 判断下载是否成功。
+    
+    Returns:
+        写入的字节数
+    """
+    written = 0
+    try:
+        if aiofiles is None:
+            with open(path, 'wb') as f:
+                async for chunk in response.content.iter_any():
+                    f.write(chunk)
+                    written += len(chunk)
+        else:
+            pending = bytearray()
+            async with aiofiles.open(path, 'wb') as f:
+                async for chunk in response.content.iter_any():
+                    pending += chunk
+                    if len(pending) >= WRITE_BATCH_SIZE:
+                        await f.write(pending)
+                        written += len(pending)
+                        pending.clear()
+                if pending:
+                    await f.write(pending)
+                    written += len(pending)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return written
+
+
+class APIStatusError(Exception):
+    """生成接口返回非200状态（aiohttp/httpx 两种后端统一抛出）"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status} - {message}")
+        self.status = status
+        self.message = message
+
 
 class JiekouAIImageService:
     """
@@ -32,48 +208,340 @@ class JiekouAIImageService:
         }
     """
     
-    # 支持的尺寸映射
-    SIZE_MAPPING = {
-        "512x512": "1x1",
-        "768x432": "16x9",
-        "1024x1024": "1x1",
-        "1280x720": "16x9",
+    # 支持的分辨率 -> (API尺寸比例, 质量)，一次查找同时得到两个字段
+    # 质量 - 接口AI只支持 "1k", "2k", "4k"
+    DIM_MAPPING = {
+        "512x512": ("1x1", "1k"),
+        "768x432": ("16x9", "1k"),
+        "1024x1024": ("1x1", "1k"),
+        "1280x720": ("16x9", "1k"),
     }
+    DEFAULT_DIM = ("1x1", "1k")
+    
+    # 请求体公共字段模板（各生成方法在此基础上补充 size/prompt/quality/images）
+    PAYLOAD_BASE = {"n": 1, "response_format": "url"}
+    
+    # 超时设置：建连单独限时，卡住的连接快速失败进入重试；
+    # 读取不单独限时，给服务端推理留足 total 预算
+    CONNECT_TIMEOUT = 5
+    REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=180, sock_connect=CONNECT_TIMEOUT)
+    
+    # 重试策略：只有限流/超时/服务端错误值得重试，其余状态码（400/401/403/404/422等）立即失败；
+    # 退避时间加入随机抖动，避免大量并发任务在同一时刻集中重试
+    RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 30
     
-    # 质量映射 - 接口AI只支持 "1k", "2k", "4k"
-    QUALITY_MAPPING = {
-        "512x512": "1k",
-        "768x432": "1k",
-        "1024x1024": "1k",
-        "1280x720": "1k",
+    # 下载图片时 Content-Type / URL后缀 到保存扩展名的映射
+    EXT_BY_MIME = {
+        "image/jpeg": ".jpg",
+        "image/jpg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
     }
+    EXT_BY_SUFFIX = {
+        ".jpg": ".jpg",
+        ".jpeg": ".jpg",
+        ".png": ".png",
+        ".webp": ".webp",
+    }
+    
+    # 参考图压缩结果LRU缓存（跨实例共享）: (路径, mtime_ns, 文件大小, max_kb) -> base64
+    COMPRESS_CACHE_SIZE = 128
+    _compress_cache: "OrderedDict[tuple, str]" = OrderedDict()
+    
+    # 跨实例共享的连接池与会话：多个服务对象复用到 api.jiekou.ai 的 keep-alive 连接
+    # 会话与事件循环绑定，按循环分别保存：loop -> (session, connector)
+    _shared_sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, aiohttp.TCPConnector]] = {}
+    
+    # 同时进行的首帧生成数量上限（跨实例共享，按事件循环创建）
+    KEYFRAME_CONCURRENCY = 8
+    _keyframe_semaphore: Optional[asyncio.Semaphore] = None
+    _keyframe_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
     
-    def __init__(self, api_key: str, base_url: str = "https://api.jiekou.ai", endpoint: str = "/v3/nano-banana-pro-light-t2i"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.jiekou.ai",
+        endpoint: str = "/v3/nano-banana-pro-light-t2i",
+        max_concurrency: int = 4,
+        use_http2: bool = False
+    ):
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
         self.endpoint = endpoint
-        self.session: Optional[aiohttp.ClientSession] = None
+        # 可选的 HTTP/2 后端：多个生成请求复用同一条TLS连接（需要安装 h2）
+        self.use_http2 = use_http2
+        self.http2_client: Optional[httpx.AsyncClient] = None
+        # 请求URL和请求头只构建一次
+        self._t2i_url = f"{self.base_url}{self.endpoint}"
+        self._i2i_url = f"{self.base_url}/v3/nano-banana-pro-light-i2i"
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        # 限制同时在途的生成请求数，避免触发API限流 (HTTP 429)
+        self.max_concurrency = max_concurrency
+        # 信号量与事件循环绑定，首次使用时按当前循环创建
+        self._api_semaphore: Optional[asyncio.Semaphore] = None
+        self._api_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """获取HTTP会话"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        """获取当前事件循环上跨实例共享的HTTP会话"""
+        cls = JiekouAIImageService
+        loop = asyncio.get_running_loop()
+        entry = cls._shared_sessions.get(loop)
+        # 创建过程中没有 await，协程之间不会交错，无需加锁
+        if entry is None or entry[0].closed:
+            # 顺带清理已关闭循环留下的会话，避免字典随循环更替增长
+            for stale in [l for l in cls._shared_sessions if l.is_closed()]:
+                del cls._shared_sessions[stale]
+            connector = aiohttp.TCPConnector(
+                limit=0,
+                limit_per_host=32,
+                keepalive_timeout=75,
+                ttl_dns_cache=600,
+                enable_cleanup_closed=True,
+                resolver=AsyncResolver() if AsyncResolver else None
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=False,
+                timeout=cls.REQUEST_TIMEOUT
+            )
+            entry = cls._shared_sessions[loop] = (session, connector)
+        return entry[0]
+    
+    @classmethod
+    def _get_keyframe_semaphore(cls) -> asyncio.Semaphore:
+        """获取跨实例共享的首帧并发信号量"""
+        loop = asyncio.get_running_loop()
+        if cls._keyframe_semaphore is None or cls._keyframe_semaphore_loop is not loop:
+            cls._keyframe_semaphore = asyncio.Semaphore(cls.KEYFRAME_CONCURRENCY)
+            cls._keyframe_semaphore_loop = loop
+        return cls._keyframe_semaphore
+    
+    def _get_api_semaphore(self) -> asyncio.Semaphore:
+        """获取当前事件循环上的生成请求并发信号量"""
+        loop = asyncio.get_running_loop()
+        if self._api_semaphore is None or self._api_semaphore_loop is not loop:
+            self._api_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._api_semaphore_loop = loop
+        return self._api_semaphore
+    
+    def _get_http2_client(self) -> Optional[httpx.AsyncClient]:
+        """获取 HTTP/2 客户端，未安装 h2 时关闭 HTTP/2 并返回None"""
+        if self.http2_client is None and self.use_http2:
+            try:
+                self.http2_client = httpx.AsyncClient(
+                    http2=True,
+                    timeout=httpx.Timeout(180, connect=self.CONNECT_TIMEOUT),
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                )
+            except ImportError:
+                logger.warning("⚠️ 未安装 h2，HTTP/2 不可用，改用 aiohttp")
+                self.use_http2 = False
+        return self.http2_client
     
     async def close(self):
-        """关闭HTTP会话"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """释放实例自有资源；共享连接池保持存活，进程退出时调用 shutdown()"""
+        if self.http2_client is not None:
+            await self.http2_client.aclose()
+            self.http2_client = None
     
-    def _map_size(self, width: int, height: int) -> str:
-        """将分辨率映射到API支持的尺寸格式"""
+    async def warmup(self) -> bool:
+        """
+        预热到API服务器的连接：提前完成DNS解析与TLS握手并放入连接池，
+        首个生成请求无需再支付建连延迟（服务启动时调用）
+        
+        Returns:
+            是否成功建立连接（任意HTTP状态码都视为成功）
+        """
+        try:
+            http2_client = self._get_http2_client()
+            if http2_client is not None:
+                await http2_client.head(self.base_url)
+            else:
+                session = await self._get_session()
+                async with session.head(
+                    self.base_url,
+                    timeout=aiohttp.ClientTimeout(total=self.CONNECT_TIMEOUT * 2, sock_connect=self.CONNECT_TIMEOUT)
+                ):
+                    pass
+            logger.debug("🔥 已预热连接: %s", self.base_url)
+            return True
+        except (asyncio.TimeoutError, aiohttp.ClientError, httpx.HTTPError) as e:
+            logger.debug("⚠️ 连接预热失败: %s", e)
+            return False
+    
+    @classmethod
+    async def shutdown(cls):
+        """关闭所有事件循环上跨实例共享的HTTP会话与连接池（进程退出时调用）"""
+        entries, cls._shared_sessions = cls._shared_sessions, {}
+        current = asyncio.get_running_loop()
+        for loop, (session, connector) in entries.items():
+            if loop is current:
+                await cls._close_session(session, connector)
+            elif loop.is_running():
+                # 其他线程中仍在运行的循环：会话只能在其所属循环上关闭
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(cls._close_session(session, connector), loop)
+                )
+            # 已关闭的循环无法再驱动关闭流程，连接随传输对象回收时释放
+    
+    @staticmethod
+    async def _close_session(session: aiohttp.ClientSession, connector: aiohttp.TCPConnector):
+        """关闭一组共享会话与连接池"""
+        if not session.closed:
+            await session.close()
+        if not connector.closed:
+            await connector.close()
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def _map_dims(width: int, height: int) -> Tuple[str, str]:
+        """
+        分辨率 -> (API尺寸比例, 质量)，按 (width, height) 缓存，不必每次拼接查找key
+        
+        分辨率来自用户配置，不在映射表中时回退到 DEFAULT_DIM 并告警（按尺寸缓存，每种尺寸只告警一次）。
+        """
         key = f"{width}x{height}"
-        return self.SIZE_MAPPING.get(key, "1x1")
+        dims = JiekouAIImageService.DIM_MAPPING.get(key)
+        if dims is None:
+            dims = JiekouAIImageService.DEFAULT_DIM
+            logger.warning(
+                "⚠️ 接口AI不支持尺寸 %s（可选: %s），按 %s @ %s 生成",
+                key, ", ".join(JiekouAIImageService.DIM_MAPPING), *dims
+            )
+        return dims
     
-    def _map_quality(self, width: int, height: int) -> str:
+    @staticmethod
+    def _map_size(width: int, height: int) -> str:
+        """将分辨率映射到API支持的尺寸格式"""
+        return JiekouAIImageService._map_dims(width, height)[0]
+    
+    @staticmethod
+    def _map_quality(width: int, height: int) -> str:
         """根据分辨率选择质量"""
-        key = f"{width}x{height}"
-        return self.QUALITY_MAPPING.get(key, "1k")
+        return JiekouAIImageService._map_dims(width, height)[1]
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        width: int,
+        height: int,
+        n: int = 1,
+        response_format: str = "url",
+        images: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """基于公共字段模板构建 t2i/i2i 请求体"""
+        size, quality = self._map_dims(width, height)
+        payload = self.PAYLOAD_BASE | {"size": size, "prompt": prompt, "quality": quality}
+        if n != 1:
+            payload["n"] = n
+        if response_format != "url":
+            payload["response_format"] = response_format
+        if images is not None:
+            payload["images"] = images
+        return payload
+    
+    async def _post_once(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送一次请求并返回解析后的JSON，非200状态抛出 APIStatusError（附带响应内容）"""
+        http2_client = self._get_http2_client()
+        if http2_client is not None:
+            async with self._get_api_semaphore():
+                response = await http2_client.post(
+                    url,
+                    content=_json_dumps_bytes(payload),
+                    headers=self._headers
+                )
+            if response.status_code != 200:
+                raise APIStatusError(response.status_code, response.text[:500])
+            return _json_loads(response.content)
+        
+        session = await self._get_session()
+        async with self._get_api_semaphore(), session.post(
+            url,
+            data=_json_dumps_bytes(payload),
+            headers=self._headers,
+            timeout=self.REQUEST_TIMEOUT
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise APIStatusError(response.status, error_text[:500])
+            return _json_loads(await response.read())
+    
+    async def _post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        max_retries: int = 3
+    ) -> Dict[str, Any]:
+        """
+        提交生成请求并解析返回的图片（t2i/i2i 共用的重试与错误处理）
+        
+        Args:
+            url: 完整请求URL
+            payload: 请求体
+            max_retries: 最大重试次数
+        
+        Returns:
+            包含图片URL或base64的字典
+        """
+        for attempt in range(max_retries):
+            raw_response = None
+            retryable = True
+            try:
+                logger.debug("🚀 提交图片生成任务: %s (尝试 %d/%d)", url, attempt + 1, max_retries)
+                
+                start_time = time.time()
+                data = await self._post_once(url, payload)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("📥 响应耗时: %.2f秒, 内容: %s", time.time() - start_time, data)
+                
+                images = data.get("data")
+                if isinstance(images, list) and images and images[0].get("url"):
+                    image_data = images[0]
+                    logger.debug("✅ 成功获取URL: %s", image_data["url"])
+                    return {
+                        "success": True,
+                        "url": image_data.get("url"),
+                        "base64": image_data.get("b64_json"),
+                        "prompt": payload.get("prompt"),
+                        "cost_usd": 0.02
+                    }
+                
+                if "error" in data:
+                    error_msg = f"API错误: {data['error']}"
+                else:
+                    error_msg = f"API未返回图片URL: {data}"
+                raw_response = data
+            
+            # 只把网络/HTTP/响应格式问题转换为失败结果并重试，其他异常（代码缺陷）直接抛出
+            except APIStatusError as e:
+                error_msg = f"API错误: {e}"
+                raw_response = e.message
+                retryable = e.status in self.RETRYABLE_STATUSES
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                error_msg = "请求超时"
+            except (aiohttp.ClientError, httpx.HTTPError) as e:
+                error_msg = f"请求异常: {str(e)}"
+            except ValueError as e:
+                error_msg = f"响应解析失败: {str(e)}"
+            
+            logger.warning("❌ %s (尝试 %d/%d)", error_msg, attempt + 1, max_retries)
+            if retryable and attempt < max_retries - 1:
+                wait_time = min(self.BACKOFF_BASE * 2 ** attempt * (0.5 + random.random()), self.BACKOFF_MAX)
+                logger.info("⏳ 等待%.1f秒后重试...", wait_time)
+                await asyncio.sleep(wait_time)
+                continue
+            
+            result = {"success": False, "error": error_msg}
+            if raw_response is not None:
+                result["raw_response"] = raw_response
+            return result
+        
+        return {"success": False, "error": "达到最大重试次数"}
     
     async def generate_image(
         self,
@@ -98,127 +566,11 @@ class JiekouAIImageService:
         Returns:
             包含图片URL或base64的字典
         """
-        session = await self._get_session()
-        
-        # 构建请求体
-        payload = {
-            "n": n,
-            "size": self._map_size(width, height),
-            "prompt": prompt,
-            "quality": self._map_quality(width, height),
-            "response_format": response_format
-        }
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        url = f"{self.base_url}{self.endpoint}"
+        payload = self._build_payload(prompt, width, height, n, response_format)
         
-        for attempt in range(max_retries):
-            try:
-                print(f"    🚀 提交图片生成任务 (尝试 {attempt + 1}/{max_retries})")
-                print(f"    📌 URL: {url}")
-                print(f"    📌 Prompt: {prompt[:100]}...")
-                print(f"    📌 Size: {width}x{height} -> {self._map_size(width, height)}")
-                print(f"    📌 Quality: {self._map_quality(width, height)}")
-                print(f"    📌 Request Body: {payload}")
-                
-                import time
-                start_time = time.time()
-                
-                async with session.post(
-                    url,
-                    json=payload,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=180)
-                ) as response:
-                    elapsed = time.time() - start_time
-                    print(f"    ⏱️ 请求耗时: {elapsed:.2f}秒")
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"    📥 HTTP 200 响应")
-                        print(f"    📥 响应内容: {data}")
-                        print(f"    📥 响应键: {list(data.keys())}")
-                        
-                        # 检查是否返回了图片URL
-                        if data.get("data"):
-                            print(f"    📥 data字段存在: {type(data['data'])}, 长度: {len(data['data']) if isinstance(data['data'], list) else 'N/A'}")
-                            if isinstance(data["data"], list) and len(data["data"]) > 0:
-                                image_data = data["data"][0]
-                                print(f"    📥 image_data: {image_data}")
-                                if image_data.get("url"):
-                                    print(f"    ✅ 成功获取URL: {image_data['url'][:60]}...")
-                                    return {
-                                        "success": True,
-                                        "url": image_data.get("url"),
-                                        "base64": image_data.get("b64_json"),
-                                        "prompt": prompt,
-                                        "cost_usd": 0.02
-                                    }
-                                else:
-                                    print(f"    ⚠️ image_data 没有 url 字段")
-                            else:
-                                print(f"    ⚠️ data 为空或不是列表")
-                        else:
-                            print(f"    ⚠️ 响应没有 data 字段")
-                        
-                        # 检查是否有错误信息
-                        if "error" in data:
-                            error_msg = f"API错误: {data['error']}"
-                            print(f"    ❌ {error_msg}")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(2 ** attempt)
-                                continue
-                            return {"success": False, "error": error_msg, "raw_response": data}
-                        
-                        if data.get("message"):
-                            print(f"    ℹ️ API返回message: {data['message']}")
-                        
-                        # 重试
-                        error_msg = f"API未返回图片URL: {data}"
-                        print(f"    ⚠️ {error_msg}")
-                        if attempt < max_retries - 1:
-                            wait_time = 2 ** attempt
-                            print(f"    ⏳ 等待{wait_time}秒后重试...")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        return {"success": False, "error": error_msg, "raw_response": data}
-                    else:
-                        error_text = await response.text()
-                        error_msg = f"API错误: HTTP {response.status}"
-                        print(f"    ❌ {error_msg}")
-                        print(f"    ❌ 响应内容: {error_text[:500]}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        return {"success": False, "error": error_msg, "raw_response": error_text}
-                        
-            except asyncio.TimeoutError:
-                print(f"    ⏱️ 请求超时 (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {
-                    "success": False,
-                    "error": "请求超时"
-                }
-            except Exception as e:
-                error_msg = f"请求异常: {str(e)}"
-                print(f"    ❌ {error_msg}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {
-                    "success": False,
-                    "error": error_msg
-                }
-        
-        return {
-            "success": False,
-            "error": "达到最大重试次数"
-        }
+        logger.debug("📌 Prompt: %.100s...", prompt)
+        logger.debug("📌 Size: %dx%d -> %s, Quality: %s", width, height, payload["size"], payload["quality"])
+        return await self._post_json(self._t2i_url, payload, max_retries)
     
     async def generate_character_reference(
         self,
@@ -275,87 +627,14 @@ class JiekouAIImageService:
         Returns:
             包含图片URL或base64的字典
         """
-        session = await self._get_session()
+        # 没有参考图时 i2i 没有意义，直接走 t2i，省去一次无效的API往返
+        if not image_url:
+            return await self.generate_image(prompt, width, height, n, response_format, max_retries)
         
-        # 构建请求体 - i2i API (images 是字符串数组)
-        payload = {
-            "n": n,
-            "size": self._map_size(width, height),
-            "images": [image_url],
-            "prompt": prompt,
-            "quality": self._map_quality(width, height),
-            "response_format": response_format
-        }
+        # i2i API (images 是字符串数组)
+        payload = self._build_payload(prompt, width, height, n, response_format, images=[image_url])
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        url = f"{self.base_url}/v3/nano-banana-pro-light-i2i"
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"    🚀 提交i2i图片生成任务 (尝试 {attempt + 1}/{max_retries})")
-                async with session.post(
-                    url,
-                    json=payload,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=180)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"    📥 响应: {data}")
-                        
-                        if data.get("data") and len(data["data"]) > 0:
-                            image_data = data["data"][0]
-                            if image_data.get("url"):
-                                return {
-                                    "success": True,
-                                    "url": image_data.get("url"),
-                                    "base64": image_data.get("b64_json"),
-                                    "prompt": prompt,
-                                    "cost_usd": 0.02
-                                }
-                        
-                        if "error" in data:
-                            error_msg = f"API错误: {data['error']}"
-                            print(f"    ❌ {error_msg}")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(2 ** attempt)
-                                continue
-                            return {"success": False, "error": error_msg, "raw_response": data}
-                        
-                        error_msg = f"API未返回图片URL: {data}"
-                        print(f"    ⚠️ {error_msg}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        return {"success": False, "error": error_msg, "raw_response": data}
-                    else:
-                        error_text = await response.text()
-                        error_msg = f"API错误: {response.status} - {error_text}"
-                        print(f"    ❌ {error_msg}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        return {"success": False, "error": error_msg}
-                        
-            except asyncio.TimeoutError:
-                print(f"    ⏱️ 请求超时 (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {"success": False, "error": "请求超时"}
-            except Exception as e:
-                error_msg = f"请求异常: {str(e)}"
-                print(f"    ❌ {error_msg}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {"success": False, "error": error_msg}
-        
-        return {"success": False, "error": "达到最大重试次数"}
+        return await self._post_json(self._i2i_url, payload, max_retries)
 
     async def generate_scene_reference(
         self,
@@ -390,137 +669,198 @@ class JiekouAIImageService:
         
         return None
 
+    @staticmethod
+    def _open_reference_image(path: str) -> Image.Image:
+        """
+        打开参考图并转换为可编码为JPEG的模式
+        
+        JPEG输入使用 draft 在解码(IDCT)阶段直接按 1/2~1/8 缩小：压缩目标只有几百KB，
+        全分辨率解码的像素最终都会被丢弃。请求尺寸不低于1024，保证参考图细节。
+        文件不存在时直接抛出 FileNotFoundError，无需先 stat。
+        """
+        img = Image.open(path)
+        if img.format == 'JPEG':
+            img.draft('RGB', (max(img.width // 4, 1024), max(img.height // 4, 1024)))
+        
+        # 转换为 RGB（去除透明通道）
+        if img.mode in ('RGBA', 'P'):
+            img = img.convert('RGB')
+        return img
+    
+    @staticmethod
+    def _encode_jpeg_within_budget(
+        img: Image.Image,
+        max_kb: int,
+        min_quality: int = 20,
+        max_quality: int = 85
+    ) -> Optional[bytes]:
+        """
+        查找不超过体积上限的最高JPEG质量
+        
+        先编码 max_quality（多数参考图一次即满足），再编码 min_quality 确认有解；
+        之后按两端体积的对数做线性插值估算目标质量（JPEG体积随质量近似指数增长），
+        逼近真实边界。若同一端连续两次被
+        更新（插值偏向一侧），下一步改用二分，保证步数不超过二分查找的两倍。
+        查找阶段关闭 optimize 以减少编码耗时，只对最终选中的质量开启
+        optimize（只会让体积更小，不会超出上限）；使用 libjpeg-turbo 时跳过这一步。
+        
+        Returns:
+            JPEG字节，质量降到 min_quality 仍超限时返回None
+        """
+        max_bytes = max_kb * 1024
+        encode = _make_jpeg_encoder(img)
+        
+        hi_encoded = encode(max_quality)
+        if len(hi_encoded) <= max_bytes:
+            best_quality, best_encoded = max_quality, hi_encoded
+        else:
+            best_encoded = encode(min_quality)
+            if len(best_encoded) > max_bytes:
+                return None
+            
+            # 不变式: lo 满足上限, hi 超出上限
+            lo, lo_size = min_quality, len(best_encoded)
+            hi, hi_size = max_quality, len(hi_encoded)
+            best_quality = lo
+            last_side = None
+            repeated = False
+            while hi - lo > 1:
+                if repeated or hi_size <= lo_size:
+                    quality = (lo + hi) // 2
+                else:
+                    quality = lo + int(
+                        (math.log(max_bytes) - math.log(lo_size)) * (hi - lo)
+                        / (math.log(hi_size) - math.log(lo_size))
+                    )
+                    quality = min(max(quality, lo + 1), hi - 1)
+                
+                encoded = encode(quality)
+                side = 'lo' if len(encoded) <= max_bytes else 'hi'
+                if side == 'lo':
+                    lo, lo_size = quality, len(encoded)
+                    best_quality, best_encoded = quality, encoded
+                else:
+                    hi, hi_size = quality, len(encoded)
+                repeated = side == last_side
+                last_side = side
+        
+        if best_encoded is None or (_turbo_jpeg is not None and img.mode == 'RGB'):
+            return best_encoded
+        
+        optimized = encode(best_quality, optimize=True)
+        return optimized if len(optimized) <= len(best_encoded) else best_encoded
+
+    @staticmethod
+    def _downscale_within_budget(img: Image.Image, max_kb: int) -> Tuple[bytes, Tuple[int, int]]:
+        """
+        质量降到下限仍超限时，按 0.9→0.3 的比例缩小尺寸后以 q70 编码
+        
+        JPEG体积近似与像素数成正比（缩小后单位像素的细节更多，实际体积只会更大），
+        先用原尺寸 q70 的体积估算可行的最大比例，跳过必然超限的档位。
+        档位查找阶段关闭 optimize，只对选中的结果开启。
+        
+        Returns:
+            (JPEG字节, 尺寸)，所有档位都超限时强制缩到 512x512 (q60)
+        """
+        max_bytes = max_kb * 1024
+        downscale = _make_downscaler(img)
+        estimate = math.sqrt(max_bytes / len(_encode_jpeg(img, 70)))
+        
+        for step in range(9, 2, -1):
+            ratio = step / 10
+            if ratio > estimate:
+                continue
+            new_size = (int(img.width * ratio), int(img.height * ratio))
+            resized = downscale(new_size)
+            encode = _make_jpeg_encoder(resized)
+            encoded = encode(70)
+            if len(encoded) <= max_bytes:
+                if _turbo_jpeg is None or resized.mode != 'RGB':
+                    optimized = encode(70, optimize=True)
+                    encoded = min(encoded, optimized, key=len)
+                return encoded, new_size
+        
+        return _encode_jpeg(downscale((512, 512)), 60), (512, 512)
+
     async def _compress_image_to_base64(self, local_path: str, max_size_kb: int = 300) -> Optional[str]:
         """压缩图片并转为base64编码（异步版本，避免阻塞事件循环）"""
-        import concurrent.futures
-        
         def _do_compress(path_str: str, max_kb: int) -> Optional[str]:
             """实际压缩操作（在线程池中执行）"""
             try:
-                path = Path(path_str)
-                if not path.exists():
-                    return None
-                
-                # 打开图片
-                img = Image.open(path)
-                
-                # 转换为 RGB（去除透明通道）
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
+                img = self._open_reference_image(path_str)
                 
-                # 初始质量
-                quality = 85
-                
-                while quality > 20:
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG', quality=quality, optimize=True)
-                    size_kb = buffer.tell() / 1024
-                    
-                    if size_kb <= max_kb:
-                        return base64.b64encode(buffer.getvalue()).decode('utf-8')
-                    
-                    quality -= 10
+                # 二分查找满足体积要求的最高质量
+                encoded = self._encode_jpeg_within_budget(img, max_kb)
+                if encoded is not None:
+                    return _b64encode_str(encoded)
                 
                 # 如果质量降到 20 还是太大，缩小尺寸
-                ratio = 0.9
-                while ratio > 0.3:
-                    new_size = (int(img.width * ratio), int(img.height * ratio))
-                    resized = img.resize(new_size, Image.Resampling.LANCZOS)
-                    buffer = io.BytesIO()
-                    resized.save(buffer, format='JPEG', quality=70, optimize=True)
-                    size_kb = buffer.tell() / 1024
-                    
-                    if size_kb <= max_kb:
-                        return base64.b64encode(buffer.getvalue()).decode('utf-8')
-                    
-                    ratio -= 0.1
-                
-                # 最后尝试
-                buffer = io.BytesIO()
-                img.resize((512, 512), Image.Resampling.LANCZOS).save(buffer, format='JPEG', quality=60)
-                return base64.b64encode(buffer.getvalue()).decode('utf-8')
+                encoded, _ = self._downscale_within_budget(img, max_kb)
+                return _b64encode_str(encoded)
                 
             except Exception as e:
-                print(f"    ⚠️ 压缩图片失败: {e}")
+                logger.warning("⚠️ 压缩图片失败: %s", e)
                 return None
         
+        # 同一参考图在多个首帧间复用，命中缓存时跳过压缩（文件被修改后 mtime/大小变化即失效）
+        try:
+            stat = os.stat(local_path)
+        except OSError as e:
+            logger.debug("⚠️ 参考图不可读: %s", e)
+            return None
+        cache_key = (local_path, stat.st_mtime_ns, stat.st_size, max_size_kb)
+        cached = self._compress_cache.get(cache_key)
+        if cached is not None:
+            self._compress_cache.move_to_end(cache_key)
+            return cached
+        
         # 在线程池中执行压缩操作
         try:
-            import time
             start_time = time.time()
             
-            loop = asyncio.get_event_loop()
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                result = await loop.run_in_executor(
-                    pool, 
-                    _do_compress, 
-                    local_path, 
-                    max_size_kb
-                )
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                _COMPRESS_EXECUTOR,
+                _do_compress,
+                local_path,
+                max_size_kb
+            )
             
             elapsed = time.time() - start_time
             if result:
-                print(f"    📦 图片压缩完成，耗时: {elapsed:.2f}秒")
+                logger.debug("📦 图片压缩完成，耗时: %.2f秒", elapsed)
+                self._compress_cache[cache_key] = result
+                if len(self._compress_cache) > self.COMPRESS_CACHE_SIZE:
+                    self._compress_cache.popitem(last=False)
             
             return result
             
         except Exception as e:
-            print(f"    ⚠️ 异步压缩图片失败: {e}")
+            logger.warning("⚠️ 异步压缩图片失败: %s", e)
             return None
     
     # 保留同步版本供兼容（已废弃）
     def _compress_image_to_base64_sync(self, local_path: str, max_size_kb: int = 300) -> Optional[str]:
         """压缩图片并转为base64编码（同步版本，已废弃，请使用异步版本）"""
         try:
-            path = Path(local_path)
-            if not path.exists():
-                print(f"    ⚠️ 图片不存在: {local_path}")
-                return None
-            
-            # 打开图片
-            img = Image.open(path)
+            img = self._open_reference_image(local_path)
             
-            # 转换为 RGB（去除透明通道）
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # 初始质量
-            quality = 85
-            
-            while quality > 20:
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=quality, optimize=True)
-                size_kb = buffer.tell() / 1024
-                
-                if size_kb <= max_size_kb:
-                    print(f"    📦 压缩后: {size_kb:.1f}KB (quality={quality})")
-                    return base64.b64encode(buffer.getvalue()).decode('utf-8')
-                
-                quality -= 10
+            # 二分查找满足体积要求的最高质量
+            encoded = self._encode_jpeg_within_budget(img, max_size_kb)
+            if encoded is not None:
+                logger.debug("📦 压缩后: %.1fKB", len(encoded) / 1024)
+                return _b64encode_str(encoded)
             
             # 如果质量降到 20 还是太大，缩小尺寸
-            ratio = 0.9
-            while ratio > 0.3:
-                new_size = (int(img.width * ratio), int(img.height * ratio))
-                resized = img.resize(new_size, Image.Resampling.LANCZOS)
-                buffer = io.BytesIO()
-                resized.save(buffer, format='JPEG', quality=70, optimize=True)
-                size_kb = buffer.tell() / 1024
-                
-                if size_kb <= max_size_kb:
-                    print(f"    📦 压缩后: {size_kb:.1f}KB (尺寸={new_size[0]}x{new_size[1]})")
-                    return base64.b64encode(buffer.getvalue()).decode('utf-8')
-                
-                ratio -= 0.1
-            
-            # 最后尝试
-            buffer = io.BytesIO()
-            img.resize((512, 512), Image.Resampling.LANCZOS).save(buffer, format='JPEG', quality=60)
-            print(f"    📦 强制压缩到 512x512")
-            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+            encoded, new_size = self._downscale_within_budget(img, max_size_kb)
+            logger.debug("📦 压缩后: %.1fKB (尺寸=%dx%d)", len(encoded) / 1024, *new_size)
+            return _b64encode_str(encoded)
             
+        except FileNotFoundError:
+            logger.warning("⚠️ 图片不存在: %s", local_path)
+            return None
         except Exception as e:
-            print(f"    ⚠️ 压缩图片失败: {e}")
+            logger.warning("⚠️ 压缩图片失败: %s", e)
             return None
 
     async def generate_keyframe(
@@ -538,63 +878,87 @@ class JiekouAIImageService:
             prompt: 提示词
             output_path: 输出路径
             size: 尺寸 (默认1280x720)
-            character_refs: 角色参考图路径列表
-            scene_ref: 场景参考图路径
+            character_refs: 角色参考图列表（本地路径或 http(s) URL）
+            scene_ref: 场景参考图（本地路径或 http(s) URL）
         
         Returns:
             实际保存的路径，失败返回None
         """
-        import time
         total_start_time = time.time()
         
         width, height = map(int, size.split('x'))
         
-        print(f"🎬 [性能] 开始首帧生成流程")
-        
-        # 压缩并编码参考图（异步执行）
-        reference_images = []
-        if scene_ref:
-            scene_b64 = await self._compress_image_to_base64(scene_ref, max_size_kb=300)
-            if scene_b64:
-                reference_images.append(scene_b64)
-                print(f"  📷 场景参考图已压缩")
+        # 跨调用方限制同时进行的首帧数量（批量作业、单镜头接口共用）
+        async with self._get_keyframe_semaphore():
+            logger.debug("🎬 [性能] 开始首帧生成流程")
+            
+            # 压缩并编码参考图（异步执行）
+            reference_images = await self._prepare_reference_images(character_refs, scene_ref)
+            result = await self._request_keyframe(prompt, width, height, reference_images)
+            
+            if result["success"] and result.get("url"):
+                logger.debug("✅ 图片生成成功，URL: %s", result["url"])
+                actual_path = await self._download_image_with_ext(result["url"], output_path)
+                
+                total_elapsed = time.time() - total_start_time
+                logger.info("✅ [性能] 首帧生成总耗时: %.2f秒", total_elapsed)
+                return actual_path
+            else:
+                logger.error("❌ 图片生成失败: %s", result.get("error", "未知错误"))
+                
+                total_elapsed = time.time() - total_start_time
+                logger.info("❌ [性能] 首帧生成失败，耗时: %.2f秒", total_elapsed)
         
-        if character_refs:
-            for path in character_refs:
-                char_b64 = await self._compress_image_to_base64(path, max_size_kb=300)
-                if char_b64:
-                    reference_images.append(char_b64)
-                    print(f"  📷 角色参考图已压缩")
+        return None
+    
+    async def _prepare_reference_images(
+        self,
+        character_refs: Optional[List[str]],
+        scene_ref: Optional[str]
+    ) -> List[str]:
+        """
+        准备首帧参考图（场景在前，角色在后）
         
-        print(f"  📊 参考图数量: {len(reference_images)} (场景: {scene_ref is not None}, 人物: {len(character_refs) if character_refs else 0})")
+        已托管的 http(s) URL 直接交给 i2i 接口，省去本地解码/压缩与base64上传；
+        本地路径才压缩为base64，多张参考图并行压缩。
+        """
+        refs = ([scene_ref] if scene_ref else []) + list(character_refs or [])
+        results = await asyncio.gather(
+            *(self._resolve_reference_image(ref) for ref in refs)
+        )
+        reference_images = [b64 for b64 in results if b64]
         
-        # 如果有参考图，使用i2i；否则使用t2i
+        logger.debug(
+            "📊 参考图数量: %d (场景: %s, 人物: %d)",
+            len(reference_images), scene_ref is not None, len(character_refs or ())
+        )
+        return reference_images
+    
+    async def _resolve_reference_image(self, ref: str) -> Optional[str]:
+        """参考图为URL时原样返回，为本地路径时压缩为base64"""
+        ref = str(ref)
+        if ref.startswith(("http://", "https://")):
+            return ref
+        return await self._compress_image_to_base64(ref, max_size_kb=300)
+    
+    async def _request_keyframe(
+        self,
+        prompt: str,
+        width: int,
+        height: int,
+        reference_images: List[str]
+    ) -> Dict[str, Any]:
+        """有参考图时使用多图i2i，否则使用t2i"""
         if reference_images:
-            print(f"  🎨 使用多图i2i生成，尺寸: {width}x{height}")
-            result = await self.generate_image_multi_i2i(
+            logger.debug("🎨 使用多图i2i生成，尺寸: %dx%d", width, height)
+            return await self.generate_image_multi_i2i(
                 prompt=prompt,
                 image_urls=reference_images,
                 width=width,
                 height=height
             )
-        else:
-            print(f"  🎨 使用t2i生成，尺寸: {width}x{height}")
-            result = await self.generate_image(prompt, width, height)
-        
-        if result["success"] and result.get("url"):
-            print(f"  ✅ 图片生成成功，URL: {result['url'][:60]}...")
-            actual_path = await self._download_image_with_ext(result["url"], output_path)
-            
-            total_elapsed = time.time() - total_start_time
-            print(f"  ✅ [性能] 首帧生成总耗时: {total_elapsed:.2f}秒")
-            return actual_path
-        else:
-            print(f"  ❌ 图片生成失败: {result.get('error', '未知错误')}")
-            
-            total_elapsed = time.time() - total_start_time
-            print(f"  ❌ [性能] 首帧生成失败，耗时: {total_elapsed:.2f}秒")
-        
-        return None
+        logger.debug("🎨 使用t2i生成，尺寸: %dx%d", width, height)
+        return await self.generate_image(prompt, width, height)
     
     async def generate_image_multi_i2i(
         self,
@@ -609,9 +973,12 @@ class JiekouAIImageService:
         """
         使用多图i2i (image-to-image) API 生成图片（支持重试）
         
+        i2i 接口只接受 JSON 请求体，images 为字符串数组（http(s) URL 或 base64），
+        不支持 multipart 上传原始JPEG字节；要避免 base64 膨胀，应尽量传入已托管的URL。
+        
         Args:
             prompt: 提示词
-            image_urls: 参考图片URL列表
+            image_urls: 参考图片列表（URL 或 base64 字符串）
             width: 图片宽度
             height: 图片高度
             n: 生成数量
@@ -621,137 +988,27 @@ class JiekouAIImageService:
         Returns:
             包含图片URL或base64的字典
         """
-        session = await self._get_session()
         images = [url for url in image_urls if url]
-
-        payload = {
-            "n": n,
-            "size": self._map_size(width, height),
-            "images": images,
-            "prompt": prompt,
-            "quality": self._map_quality(width, height),
-            "response_format": response_format
-        }
-
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
-        url = f"{self.base_url}/v3/nano-banana-pro-light-i2i"
-        print(f"    📤 发送i2i请求: {url}, images={len(images)}")
-
-        for attempt in range(max_retries):
-            try:
-                async with session.post(
-                    url,
-                    json=payload,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=180)
-                ) as response:
-                    print(f"    📥 收到响应: status={response.status}")
-                    if response.status == 200:
-                        data = await response.json()
-                        print(f"    ✅ 解析响应成功: {data}")
-
-                        if data.get("data") and len(data["data"]) > 0:
-                            image_data = data["data"][0]
-                            if image_data.get("url"):
-                                return {
-                                    "success": True,
-                                    "url": image_data.get("url"),
-                                    "base64": image_data.get("b64_json"),
-                                    "prompt": prompt,
-                                    "cost_usd": 0.02
-                                }
-                        
-                        if "error" in data:
-                            error_msg = f"API错误: {data['error']}"
-                            print(f"    ❌ {error_msg}")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(2 ** attempt)
-                                continue
-                            return {"success": False, "error": error_msg, "raw_response": data}
-                        
-                        error_msg = f"API未返回图片URL: {data}"
-                        print(f"    ⚠️ {error_msg}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        return {"success": False, "error": error_msg, "raw_response": data}
-                    else:
-                        error_text = await response.text()
-                        error_msg = f"API错误: {response.status} - {error_text}"
-                        print(f"    ❌ {error_msg}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                        return {"success": False, "error": error_msg}
-                        
-            except asyncio.TimeoutError:
-                print(f"    ⏱️ 请求超时 (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {"success": False, "error": "请求超时"}
-            except Exception as e:
-                print(f"    ❌ 请求异常: {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return {"success": False, "error": f"请求异常: {str(e)}"}
+        # 参考图全部为空时 i2i 没有意义，直接走 t2i，省去一次无效的API往返
+        if not images:
+            return await self.generate_image(prompt, width, height, n, response_format, max_retries)
         
-        return {"success": False, "error": "达到最大重试次数"}
-    
-    async def _download_image(self, url: str, output_path: Path, timeout: int = 60):
-        """下载图片到本地
+        payload = self._build_payload(prompt, width, height, n, response_format, images=images)
         
-        Args:
-            url: 图片URL
-            output_path: 输出路径
-            timeout: 下载超时时间（秒）
-        """
-        session = await self._get_session()
-        
-        import time
-        start_time = time.time()
-        
-        try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
-                if response.status == 200:
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 从 Content-Type 检测实际图片格式
-                    content_type = response.headers.get('Content-Type', '').lower()
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        actual_path = output_path.with_suffix('.jpg')
-                    elif 'png' in content_type:
-                        actual_path = output_path.with_suffix('.png')
-                    elif 'webp' in content_type:
-                        actual_path = output_path.with_suffix('.webp')
-                    else:
-                        # 默认使用请求的路径扩展名，如果没有则使用 .png
-                        actual_path = output_path if output_path.suffix else output_path.with_suffix('.png')
-                    
-                    with open(actual_path, 'wb') as f:
-                        f.write(await response.read())
-                    
-                    elapsed = time.time() - start_time
-                    print(f"    ✅ 图片下载完成: {actual_path}, 耗时: {elapsed:.2f}秒")
-                    return True
-                else:
-                    print(f"    ❌ 图片下载失败: HTTP {response.status}")
-                    return False
-                    
-        except asyncio.TimeoutError:
-            print(f"    ⏱️ 图片下载超时: {url}")
-            return False
-        except Exception as e:
-            print(f"    ❌ 图片下载失败: {e}")
-            return False
+        logger.debug("📤 发送i2i请求: %s, images=%d", self._i2i_url, len(images))
+        return await self._post_json(self._i2i_url, payload, max_retries)
     
-    async def _download_image_with_ext(self, url: str, output_path: Path, timeout: int = 60) -> Path:
-        """下载图片并返回实际保存的路径（自动检测扩展名）
+    @classmethod
+    def _detect_image_suffix(cls, content_type: str, url: Optional[str] = None) -> Optional[str]:
+        """根据 Content-Type（及可选的URL路径）返回图片扩展名，无法识别时返回None"""
+        mime = content_type.split(';', 1)[0].strip().lower()
+        suffix = cls.EXT_BY_MIME.get(mime)
+        if suffix is None and url:
+            suffix = cls.EXT_BY_SUFFIX.get(Path(urlparse(url).path).suffix.lower())
+        return suffix
+    
+    async def _download_image_with_ext(self, url: str, output_path: Path, timeout: int = 60) -> Optional[Path]:
+        """下载图片并返回实际保存的路径（自动检测扩展名），下载失败返回None
         
         Args:
             url: 图片URL
@@ -760,50 +1017,32 @@ class JiekouAIImageService:
         """
         session = await self._get_session()
         
-        import time
         start_time = time.time()
         
         try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=self.CONNECT_TIMEOUT)) as response:
                 if response.status == 200:
                     output_path.parent.mkdir(parents=True, exist_ok=True)
                     
-                    # 从 Content-Type 检测实际图片格式
-                    content_type = response.headers.get('Content-Type', '').lower()
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        actual_path = output_path.with_suffix('.jpg')
-                    elif 'png' in content_type:
-                        actual_path = output_path.with_suffix('.png')
-                    elif 'webp' in content_type:
-                        actual_path = output_path.with_suffix('.webp')
-                    else:
-                        # 尝试从 URL 检测
-                        url_lower = url.lower()
-                        if '.jpg' in url_lower or '.jpeg' in url_lower:
-                            actual_path = output_path.with_suffix('.jpg')
-                        elif '.png' in url_lower:
-                            actual_path = output_path.with_suffix('.png')
-                        elif '.webp' in url_lower:
-                            actual_path = output_path.with_suffix('.webp')
-                        else:
-                            actual_path = output_path.with_suffix('.png')
+                    # 从 Content-Type 检测实际图片格式，失败时尝试从 URL 检测
+                    suffix = self._detect_image_suffix(response.headers.get('Content-Type', ''), url)
+                    actual_path = output_path.with_suffix(suffix or '.png')
                     
-                    with open(actual_path, 'wb') as f:
-                        f.write(await response.read())
+                    await stream_response_to_file(response, actual_path)
                     
                     elapsed = time.time() - start_time
-                    print(f"    ✅ 图片下载完成: {actual_path}, 耗时: {elapsed:.2f}秒")
+                    logger.info("✅ 图片下载完成: %s, 耗时: %.2f秒", actual_path, elapsed)
                     return actual_path
                 else:
-                    print(f"    ❌ 图片下载失败: HTTP {response.status}")
-                    return output_path
+                    logger.error("❌ 图片下载失败: HTTP %s", response.status)
+                    return None
                     
         except asyncio.TimeoutError:
-            print(f"    ⏱️ 图片下载超时: {url}")
-            return output_path
+            logger.error("⏱️ 图片下载超时: %s", url)
+            return None
         except Exception as e:
-            print(f"    ❌ 图片下载失败: {e}")
-            return output_path
+            logger.error("❌ 图片下载失败: %s", e)
+            return None
     
     async def test_connection(self) -> Dict[str, Any]:
         """
@@ -3,18 +3,188 @@ LLM服务模块
 使用LiteLLM统一接口，支持多提供商切换
 """
 
+import asyncio
+import functools
+import hashlib
+import inspect
 import json
-from typing import Optional, Dict, Any
-import litellm
-from litellm import completion
+import logging
+import os
+import re
+import tempfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Awaitable, Callable
 
 from src.core.config import Config, settings
 from src.models.schemas import Character, Scene
 
+# 可选依赖：orjson 解析LLM返回的JSON比标准库快数倍，未安装时回退到 json
+# （orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，异常处理无需区分）
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# litellm 导入时会加载全部提供商SDK（数百毫秒），推迟到首次LLM调用时再导入
+litellm = None
+
+
+def _get_litellm():
+    """返回 litellm 模块，首次调用时导入"""
+    global litellm
+    if litellm is None:
+        import litellm as _litellm
+        litellm = _litellm
+    return litellm
+
+
+def _truncate(text: str, limit: int = 2000) -> str:
+    """截断调试输出中过长的文本"""
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def _split_script(script: str, limit: int) -> List[str]:
+    """
+    按行将长剧本切分为不超过 limit 字符的片段（单行超长时按 limit 硬切）
+    
+    切分点由内容决定：片段达到 limit/2 后，在行哈希满足条件的行（包括空行）之后切分，
+    超出 limit 前强制切分。剧本局部修改只影响所在片段，其余片段的提示词保持不变，
+    开启LLM响应缓存时可直接命中。
+    """
+    if len(script) <= limit:
+        return [script]
+    
+    min_size = limit // 2
+    lines = (
+        line[i:i + limit]
+        for line in script.splitlines(keepends=True)
+        for i in range(0, len(line), limit)
+    )
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) > limit:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+        if size >= min_size and zlib.crc32(line.strip().encode('utf-8')) % 8 == 0:
+            chunks.append("".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+# 提示词模板占位符格式：[[VARIABLE_NAME]]
+_PLACEHOLDER_RE = re.compile(r"\[\[([A-Z_]+)\]\]")
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(template: str) -> Tuple[str, ...]:
+    """将模板拆分为 (文本, 变量名, 文本, 变量名, ...) 交替片段，同一模板只解析一次"""
+    return tuple(_PLACEHOLDER_RE.split(template))
+
+
+def render_template(template: str, **values: str) -> str:
+    """一次遍历填充 [[占位符]]，未提供的占位符原样保留"""
+    parts = _compile_template(template)
+    return "".join(
+        part if i % 2 == 0 else values.get(part, f"[[{part}]]")
+        for i, part in enumerate(parts)
+    )
+
+
+# litellm.Router 缓存：键为部署配置JSON的sha256（不保存明文密钥），配置不变时复用同一路由器及其连接池
+_ROUTERS: "OrderedDict[str, litellm.Router]" = OrderedDict()
+# 缓存的路由器数量上限（按最近使用淘汰），配置反复切换时不会无限增长
+ROUTER_CACHE_SIZE = 4
+
+
+async def _close_router(router: "litellm.Router") -> None:
+    """关闭路由器缓存的SDK客户端（litellm 把各部署的客户端存放在路由器的内存缓存中）"""
+    cache_dict = getattr(getattr(getattr(router, "cache", None), "in_memory_cache", None), "cache_dict", None)
+    for client in list((cache_dict or {}).values()):
+        close = getattr(client, "close", None)
+        if not callable(close):
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.debug("⚠️ 关闭LLM客户端失败: %s", e)
+
+
+# LLM响应缓存目录（settings.llm_response_cache 开启时使用）
+LLM_CACHE_DIR = Path.home() / ".animation_gen" / "cache" / "llm"
+
+
+@functools.lru_cache(maxsize=256)
+def extract_json_text(text: str) -> str:
+    """从LLM响应中提取JSON部分（重试/重复响应直接命中缓存）"""
+    # 尝试找到JSON代码块：```json 代码块优先，其次任意代码块；缺少结尾围栏时取到文本末尾
+    for fence in ("```json", "```"):
+        _, sep, rest = text.partition(fence)
+        if sep:
+            return rest.partition("```")[0].strip()
+    
+    # 尝试找到花括号包围的内容
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end != -1:
+        return text[start:end+1]
+    
+    return text
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def parse_json_response(text: str) -> Any:
+    """
+    解析LLM响应中的JSON
+    
+    有代码块时整体解析代码块内容；没有时从第一个 "{" 起先按纯JSON解析（最常见，走 orjson），
+    失败再用 raw_decode 定位对象边界，对象之后的说明文字（哪怕含有 "}"）直接忽略。
+    解析失败抛出 json.JSONDecodeError。
+    """
+    if "```" in text:
+        return _json_loads(extract_json_text(text))
+    start = text.find("{")
+    if start == -1:
+        return _json_loads(text)
+    try:
+        return _json_loads(text[start:] if start else text)
+    except json.JSONDecodeError:
+        return _JSON_DECODER.raw_decode(text, start)[0]
+
 
 class LLMService:
     """LLM服务"""
     
+    # 超过此长度（字符）的剧本分段并发提取角色和场景
+    EXTRACTION_CHUNK_CHARS = 8000
+    
+    # 支持 OpenAI 风格 JSON 模式（response_format={"type": "json_object"}）的提供商
+    JSON_MODE_PROVIDERS = frozenset({"openai", "azure"})
+    JSON_MODE_FORMAT = {"type": "json_object"}
+    
+    # 剧本概要提示词（剧本内容追加在末尾）
+    SUMMARY_PROMPT_TEMPLATE = (
+        "请将以下故事总结为[[MAX_WORDS]]字的概要。\n\n"
+        "请提供：\n"
+        "1. 主要情节\n"
+        "2. 关键转折点\n"
+        "3. 故事主题\n\n"
+        "故事内容：\n"
+    )
+    
     def __init__(self, config: Optional[Config] = None):
         self.config = config or Config.load_global()
         self.llm_config = self.config.get_llm_config()
@@ -22,19 +192,110 @@ class LLMService:
         # 设置API密钥
         self._setup_api_keys()
     
+    @staticmethod
+    async def shutdown():
+        """关闭并释放缓存的路由器及其连接池（进程退出时调用）"""
+        routers = list(_ROUTERS.values())
+        _ROUTERS.clear()
+        for router in routers:
+            await _close_router(router)
+    
     def _setup_api_keys(self):
-        """设置API密钥"""
-        api_key = settings.get_api_key(self.llm_config.provider)
-        if api_key:
-            if self.llm_config.provider == "openai":
-                litellm.openai_key = api_key
-                # 设置自定义base_url（如接口AI）
-                custom_base_url = settings.get_llm_base_url()
-                if custom_base_url:
-                    litellm.api_base = custom_base_url
-                    self.llm_config.base_url = custom_base_url
-            elif self.llm_config.provider == "anthropic":
-                litellm.anthropic_key = api_key
+        """
+        设置API密钥
+        
+        密钥保存在实例上并随路由器部署配置逐请求传递，不修改 litellm 的全局变量，
+        不同提供商的并发调用互不干扰。
+        """
+        self.api_key = settings.get_api_key(self.llm_config.provider)
+        if self.api_key and self.llm_config.provider == "openai":
+            # 设置自定义base_url（如接口AI）
+            custom_base_url = settings.get_llm_base_url()
+            if custom_base_url:
+                self.llm_config.base_url = custom_base_url
+        
+        # 配置变化后重新绑定调用入口（首次调用时创建）
+        self._call = None
+    
+    def _bind_call(self) -> Callable[..., Awaitable[Any]]:
+        """
+        绑定预填好模型和默认采样参数的 acompletion 调用入口
+        
+        路由器查找（构建部署列表并序列化为缓存键）只在配置变化后做一次，
+        每次 generate 只需传入 messages 和显式覆盖的参数。
+        """
+        self._call = functools.partial(
+            self._get_router().acompletion,
+            model="primary",
+            temperature=self.llm_config.temperature,
+            max_tokens=self.llm_config.max_tokens,
+        )
+        return self._call
+    
+    def _build_model_list(self) -> List[Dict[str, Any]]:
+        """
+        构建 litellm.Router 的部署列表
+        
+        primary 为当前LLM配置；只有 llm_config.fallback_providers 中显式列出且已启用的
+        自定义LLM提供商（OpenAI兼容接口）才作为 fallback，剧本内容不会发往未选择的提供商。
+        """
+        model_list = [{
+            "model_name": "primary",
+            "litellm_params": {
+                "model": f"{self.llm_config.provider}/{self.llm_config.model}",
+                "api_key": self.api_key,
+                "api_base": self.llm_config.base_url or None,
+                "timeout": self.llm_config.timeout,
+            }
+        }]
+        fallback_ids = self.llm_config.fallback_providers
+        if not fallback_ids:
+            return model_list
+        
+        providers_by_id = {p.id: p for p in self.config.providers.get("llm", [])}
+        for provider_id in fallback_ids:
+            provider = providers_by_id.get(provider_id)
+            if provider is None or not provider.enabled or not provider.model:
+                logger.warning("⚠️ 备用LLM提供商 %s 不存在、未启用或未配置模型，已跳过", provider_id)
+                continue
+            model_list.append({
+                "model_name": "fallback",
+                "litellm_params": {
+                    "model": f"openai/{provider.model}",
+                    "api_key": provider.api_key,
+                    "api_base": provider.base_url,
+                    "timeout": provider.timeout,
+                    "extra_headers": provider.headers or None,
+                }
+            })
+        return model_list
+    
+    def _get_router(self) -> "litellm.Router":
+        """获取（或创建）当前部署配置对应的 litellm.Router"""
+        model_list = self._build_model_list()
+        num_retries = self.config.defaults.concurrency.max_retries
+        key = hashlib.sha256(
+            json.dumps([model_list, num_retries], sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        router = _ROUTERS.get(key)
+        if router is not None:
+            _ROUTERS.move_to_end(key)
+        else:
+            has_fallback = len(model_list) > 1
+            router = _get_litellm().Router(
+                model_list=model_list,
+                num_retries=num_retries,
+                fallbacks=[{"primary": ["fallback"]}] if has_fallback else [],
+            )
+            _ROUTERS[key] = router
+            if len(_ROUTERS) > ROUTER_CACHE_SIZE:
+                # 被淘汰的路由器可能仍被其他服务实例绑定使用，不主动关闭，随引用释放回收
+                _ROUTERS.popitem(last=False)
+            logger.info(
+                "🔀 LLM路由器已创建: %s (备用提供商: %d 个)",
+                model_list[0]["litellm_params"]["model"], len(model_list) - 1
+            )
+        return router
     
     def switch_provider(self, provider: str, model: Optional[str] = None):
         """切换LLM提供商"""
@@ -62,93 +323,246 @@ class LLMService:
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        cached_prefix: Optional[str] = None,
         **kwargs
     ) -> str:
         """
         生成文本
         
         Args:
-            prompt: 用户提示词
+            prompt: 用户提示词（有 cached_prefix 时为其后的动态部分）
             system_prompt: 系统提示词
             temperature: 温度参数
             max_tokens: 最大token数
+            cached_prefix: 用户消息中跨调用不变的前缀（模板部分），放在动态内容之前
+                           以命中提供商的提示词缓存
             **kwargs: 其他参数
         
         Returns:
             生成的文本
         """
+        # 消息内容统一为纯字符串（固定版本的 litellm 不支持内容块和 cache_control）；
+        # 静态前缀放在动态内容之前，提供商侧按前缀自动缓存时可以命中
         messages = []
-        
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": cached_prefix + prompt if cached_prefix else prompt})
         
-        messages.append({"role": "user", "content": prompt})
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
         
-        response = await litellm.acompletion(
-            model=f"{self.llm_config.provider}/{self.llm_config.model}",
-            messages=messages,
-            temperature=temperature or self.llm_config.temperature,
-            max_tokens=max_tokens or self.llm_config.max_tokens,
-            api_base=self.llm_config.base_url if self.llm_config.base_url else None,
-            **kwargs
-        )
+        call = self._call or self._bind_call()
+        response = await call(messages=messages, **kwargs)
         
         return response.choices[0].message.content
     
-    async def extract_characters(self, script: str) -> list:
+    async def generate_cached(
+        self,
+        prompt: str,
+        cached_prefix: Optional[str] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
         """
-        从剧本中提取角色
+        带精确匹配磁盘缓存的 generate（settings.llm_response_cache 开启时生效）
+        
+        缓存键包含提供商、模型、采样参数和完整提示词，剧本有任何改动都不会命中。
+        
+        Args:
+            prompt: 用户提示词（动态部分）
+            cached_prefix: 提示词静态前缀
+            validate: 响应校验函数，返回False的响应不写入缓存（如JSON解析失败）
+            response_format: 输出格式（如 {"type": "json_object"}），为None时自由文本输出
+        """
+        kwargs = {"response_format": response_format} if response_format is not None else {}
+        if not settings.llm_response_cache:
+            return await self.generate(prompt, cached_prefix=cached_prefix, **kwargs)
+        
+        key_source = json.dumps([
+            self.llm_config.provider, self.llm_config.model, self.llm_config.base_url,
+            self.llm_config.temperature, self.llm_config.max_tokens,
+            response_format or "",
+            cached_prefix or "", prompt
+        ], ensure_ascii=False)
+        cache_path = LLM_CACHE_DIR / f"{hashlib.sha256(key_source.encode('utf-8')).hexdigest()}.txt"
+        try:
+            return cache_path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            pass
+        
+        response = await self.generate(prompt, cached_prefix=cached_prefix, **kwargs)
+        if validate is None or validate(response):
+            # 先写临时文件再原子替换，并发写同一键时读方不会读到半个文件
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=cache_path.parent, suffix='.tmp', delete=False
+            ) as f:
+                f.write(response)
+            os.replace(f.name, cache_path)
+        return response
+    
+    def is_json_response(self, response: str) -> bool:
+        """响应中是否包含可解析的JSON"""
+        try:
+            _json_loads(self._extract_json(response))
+            return True
+        except ValueError:
+            return False
+    
+    def _supports_json_mode(self) -> bool:
+        """当前提供商是否支持 JSON 模式（litellm 原样透传 response_format）"""
+        return self.llm_config.provider in self.JSON_MODE_PROVIDERS
+    
+    def _combined_extraction_prompt(self, script: str) -> Tuple[str, str]:
+        """
+        将角色提取和场景提取两个模板合并为一次调用的 (静态前缀, 动态后缀)
+        
+        两个模板中的 [[SCRIPT]] 替换为指向文末的说明，剧本只在末尾出现一次；
+        前缀只依赖模板内容，跨剧本不变，可命中提供商的提示词缓存。
+        """
+        character_task = render_template(
+            self.config.prompts.get("character_extraction", ""), SCRIPT="（见文末剧本内容）"
+        ).strip()
+        scene_task = render_template(
+            self.config.prompts.get("scene_extraction", ""), SCRIPT="（见文末剧本内容）"
+        ).strip()
+        prefix = (
+            "请基于同一份剧本一次性完成以下两项任务。\n\n"
+            f"# 任务一：角色提取\n{character_task}\n\n"
+            f"# 任务二：场景提取\n{scene_task}\n\n"
+            "# 最终输出格式\n"
+            "只输出一个JSON对象，同时包含两项任务的结果：\n"
+            '{"characters": [任务一的角色列表], "scenes": [任务二的场景列表]}\n\n'
+            "剧本内容：\n"
+        )
+        return prefix, script
+    
+    async def extract_characters_and_scenes(self, script: str) -> Tuple[list, list]:
+        """
+        提取角色和场景
+        
+        每段剧本只需一次LLM调用，剧本只传输、预填充一次。长剧本按行切分为
+        EXTRACTION_CHUNK_CHARS 以内的片段并发提取，再按角色名去重、合并被分段边界切开的场景。
         
         Args:
             script: 剧本内容
         
         Returns:
-            角色列表
+            (角色列表, 场景列表)
         """
-        prompt_template = self.config.prompts.get("character_extraction", "")
-        # 使用 [[SCRIPT]] 占位符，避免与 JSON 大括号冲突
-        if "[[SCRIPT]]" in prompt_template:
-            prompt = prompt_template.replace("[[SCRIPT]]", script)
-        else:
-            # 如果没有占位符，直接追加剧本
-            prompt = f"{prompt_template}\n\n剧本内容：\n{script}"
-        
-        # ============ 调试输出：角色提取输入 ============
-        print("\n" + "="*60)
-        print("🎭 LLM角色提取 - 输入Prompt")
-        print("="*60)
-        print(f"Prompt长度: {len(prompt)} 字符")
-        print(f"剧本长度: {len(script)} 字符")
-        print("-"*60)
-        print(prompt[:2000] + "..." if len(prompt) > 2000 else prompt)
-        print("="*60 + "\n")
-        
-        response = await self.generate(prompt)
-        
-        # ============ 调试输出：角色提取输出 ============
-        print("\n" + "="*60)
-        print("🎭 LLM角色提取 - 输出响应")
-        print("="*60)
-        print(f"响应长度: {len(response)} 字符")
-        print("-"*60)
-        print(response[:2000] + "..." if len(response) > 2000 else response)
-        print("="*60 + "\n")
+        chunks = _split_script(script, self.EXTRACTION_CHUNK_CHARS)
+        if len(chunks) == 1:
+            return await self._extract_chunk(script)
+        
+        logger.info("✂️ 剧本较长 (%d 字符)，分为 %d 段并发提取", len(script), len(chunks))
+        results = await self._gather_limited([self._extract_chunk(chunk) for chunk in chunks])
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        
+        characters_by_name: Dict[str, dict] = {}
+        scenes: List[dict] = []
+        for chunk_characters, chunk_scenes in results:
+            for char in chunk_characters:
+                name = char.get("name")
+                if not name:
+                    # 没有名字的角色无法跨片段对应，也无法被分镜引用，直接丢弃
+                    logger.warning("⚠️ 忽略未命名角色: %s", _truncate(str(char), 200))
+                    continue
+                existing = characters_by_name.setdefault(name, char)
+                # 同一角色在前面片段中缺少的描述由后续片段补全
+                for field in ("description", "personality"):
+                    if not existing.get(field) and char.get(field):
+                        existing[field] = char[field]
+            
+            for scene in chunk_scenes:
+                previous = scenes[-1] if scenes else None
+                # 未命名场景无法判断是否为同一场景，各自保留
+                if previous is not None and scene.get("name") and previous.get("name") == scene.get("name"):
+                    # 分段边界处被切开的同一场景：拼接剧本片段，合并出场角色
+                    previous["script_segment"] = "\n".join(
+                        filter(None, (previous.get("script_segment", ""), scene.get("script_segment", "")))
+                    )
+                    names = previous.setdefault("characters", [])
+                    names.extend(n for n in scene.get("characters", []) if n not in names)
+                else:
+                    scenes.append(scene)
+        
+        characters = list(characters_by_name.values())
+        logger.info("✅ 分段提取合并完成 - 角色: %d 个, 场景: %d 个", len(characters), len(scenes))
+        return characters, scenes
+    
+    async def _extract_chunk(self, script: str) -> Tuple[list, list]:
+        """
+        对单段剧本执行一次角色+场景提取
+        
+        Args:
+            script: 剧本内容（或其片段）
+        
+        Returns:
+            (角色列表, 场景列表)
+        """
+        prefix, suffix = self._combined_extraction_prompt(script)
+        
+        # ============ 调试输出：提取输入 ============
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🔍 LLM角色+场景提取 - 输入Prompt (Prompt长度: %d 字符, 剧本长度: %d 字符)\n%s",
+                len(prefix) + len(suffix), len(script), _truncate(prefix + suffix)
+            )
+        
+        # JSON 模式下API直接返回纯JSON，无需从代码块中提取
+        json_mode = self._supports_json_mode()
+        response = await self.generate_cached(
+            suffix, cached_prefix=prefix, validate=self.is_json_response,
+            response_format=self.JSON_MODE_FORMAT if json_mode else None
+        )
+        json_text = response if json_mode else self._extract_json(response)
+        
+        # ============ 调试输出：提取输出 ============
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 LLM角色+场景提取 - 输出响应 (响应长度: %d 字符)\n%s", len(response), _truncate(response))
         
         # 解析JSON响应
         try:
-            data = json.loads(self._extract_json(response))
-            characters = data.get("characters", [])
-            
-            # 输出解析结果
-            print(f"✅ 成功解析角色: {len(characters)} 个")
-            for i, char in enumerate(characters, 1):
-                print(f"   {i}. {char.get('name', 'N/A')} - {char.get('description', 'N/A')[:50]}...")
-            
-            return characters
+            data = _json_loads(json_text)
         except json.JSONDecodeError as e:
-            print(f"❌ 角色JSON解析失败: {e}")
-            print(f"   尝试解析内容: {self._extract_json(response)[:500]}")
-            return []
+            logger.error("❌ 角色/场景JSON解析失败: %s\n   尝试解析内容: %.500s", e, json_text)
+            return [], []
+        
+        characters = data.get("characters", [])
+        scenes = data.get("scenes", [])
+        
+        # 输出解析结果
+        logger.info("✅ 成功解析角色: %d 个, 场景: %d 个", len(characters), len(scenes))
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, char in enumerate(characters, 1):
+                logger.debug("   %d. %s - %.50s...", i, char.get('name', 'N/A'), char.get('description', 'N/A'))
+            for i, scene in enumerate(scenes, 1):
+                segment = scene.get('script_segment', '')
+                logger.debug(
+                    "   %d. %s - 角色: %d 个, 剧本片段: %d 字符",
+                    i, scene.get('name', 'N/A'), len(scene.get('characters', [])), len(segment)
+                )
+                if segment:
+                    logger.debug("      片段预览: %.100s...", segment)
+        
+        return characters, scenes
+    
+    async def extract_characters(self, script: str) -> list:
+        """
+        从剧本中提取角色
+        
+        Args:
+            script: 剧本内容
+        
+        Returns:
+            角色列表
+        """
+        characters, _ = await self.extract_characters_and_scenes(script)
+        return characters
     
     async def extract_scenes(self, script: str) -> list:
         """
@@ -160,54 +574,20 @@ class LLMService:
         Returns:
             场景列表
         """
-        prompt_template = self.config.prompts.get("scene_extraction", "")
-        # 使用 [[SCRIPT]] 占位符，避免与 JSON 大括号冲突
-        if "[[SCRIPT]]" in prompt_template:
-            prompt = prompt_template.replace("[[SCRIPT]]", script)
-        else:
-            # 如果没有占位符，直接追加剧本
-            prompt = f"{prompt_template}\n\n剧本内容：\n{script}"
-        
-        # ============ 调试输出：场景提取输入 ============
-        print("\n" + "="*60)
-        print("🎬 LLM场景提取 - 输入Prompt")
-        print("="*60)
-        print(f"Prompt长度: {len(prompt)} 字符")
-        print(f"剧本长度: {len(script)} 字符")
-        print("-"*60)
-        print(prompt[:2000] + "..." if len(prompt) > 2000 else prompt)
-        print("="*60 + "\n")
-        
-        response = await self.generate(prompt)
-        
-        # ============ 调试输出：场景提取输出 ============
-        print("\n" + "="*60)
-        print("🎬 LLM场景提取 - 输出响应")
-        print("="*60)
-        print(f"响应长度: {len(response)} 字符")
-        print("-"*60)
-        print(response[:2000] + "..." if len(response) > 2000 else response)
-        print("="*60 + "\n")
+        _, scenes = await self.extract_characters_and_scenes(script)
+        return scenes
+    
+    async def extract_all(self, script: str) -> Tuple[list, list]:
+        """
+        提取角色和场景（合并为一次LLM调用）
         
-        try:
-            data = json.loads(self._extract_json(response))
-            scenes = data.get("scenes", [])
-            
-            # 输出解析结果
-            print(f"✅ 成功解析场景: {len(scenes)} 个")
-            for i, scene in enumerate(scenes, 1):
-                name = scene.get('name', 'N/A')
-                chars = scene.get('characters', [])
-                segment_len = len(scene.get('script_segment', ''))
-                print(f"   {i}. {name} - 角色: {len(chars)} 个, 剧本片段: {segment_len} 字符")
-                if segment_len > 0:
-                    print(f"      片段预览: {scene.get('script_segment', '')[:100]}...")
-            
-            return scenes
-        except json.JSONDecodeError as e:
-            print(f"❌ 场景JSON解析失败: {e}")
-            print(f"   尝试解析内容: {self._extract_json(response)[:500]}")
-            return []
+        Args:
+            script: 剧本内容
+        
+        Returns:
+            (角色列表, 场景列表)
+        """
+        return await self.extract_characters_and_scenes(script)
     
     async def generate_character_prompt(
         self,
@@ -224,12 +604,13 @@ class LLMService:
         Returns:
             图片生成提示词
         """
-        prompt_template = self.config.prompts.get("character_ref_prompt", "")
-        # 使用 replace 替换 [[占位符]] 格式
-        prompt = prompt_template.replace("[[NAME]]", character.name or "")
-        prompt = prompt.replace("[[DESCRIPTION]]", character.description or "")
-        prompt = prompt.replace("[[PERSONALITY]]", character.personality or "")
-        prompt = prompt.replace("[[STYLE]]", style_description or "")
+        prompt = render_template(
+            self.config.prompts.get("character_ref_prompt", ""),
+            NAME=character.name or "",
+            DESCRIPTION=character.description or "",
+            PERSONALITY=character.personality or "",
+            STYLE=style_description or ""
+        )
         
         return await self.generate(prompt)
     
@@ -248,16 +629,57 @@ class LLMService:
         Returns:
             图片生成提示词
         """
-        prompt_template = self.config.prompts.get("scene_ref_prompt", "")
-        # 使用 replace 替换 [[占位符]] 格式
-        prompt = prompt_template.replace("[[NAME]]", scene.name or "")
-        prompt = prompt.replace("[[DESCRIPTION]]", scene.description or "")
-        prompt = prompt.replace("[[LOCATION]]", scene.location or "")
-        prompt = prompt.replace("[[TIME]]", scene.time or "")
-        prompt = prompt.replace("[[STYLE]]", style_description or "")
+        prompt = render_template(
+            self.config.prompts.get("scene_ref_prompt", ""),
+            NAME=scene.name or "",
+            DESCRIPTION=scene.description or "",
+            LOCATION=scene.location or "",
+            TIME=scene.time or "",
+            STYLE=style_description or ""
+        )
         
         return await self.generate(prompt)
     
+    async def _gather_limited(self, coros: List[Awaitable]) -> list:
+        """并发执行多个LLM调用（并发数受 llm_workers 限制），单个失败以异常对象返回"""
+        semaphore = asyncio.Semaphore(self.config.defaults.concurrency.llm_workers)
+        
+        async def run(coro):
+            async with semaphore:
+                return await coro
+        
+        return await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
+    
+    async def generate_character_prompts_batch(
+        self,
+        characters: List[Character],
+        style_description: str
+    ) -> list:
+        """
+        并发生成多个角色的参考图提示词
+        
+        Returns:
+            与 characters 顺序一致的列表，生成失败的项为异常对象
+        """
+        return await self._gather_limited([
+            self.generate_character_prompt(character, style_description) for character in characters
+        ])
+    
+    async def generate_scene_prompts_batch(
+        self,
+        scenes: List[Scene],
+        style_description: str
+    ) -> list:
+        """
+        并发生成多个场景的参考图提示词
+        
+        Returns:
+            与 scenes 顺序一致的列表，生成失败的项为异常对象
+        """
+        return await self._gather_limited([
+            self.generate_scene_prompt(scene, style_description) for scene in scenes
+        ])
+    
     async def summarize_script(self, script: str, max_words: int = 300) -> str:
         """
         总结剧本概要
@@ -269,34 +691,41 @@ class LLMService:
         Returns:
             剧本概要
         """
-        prompt = f"""请将以下故事总结为{max_words}字的概要：
-
-{script}
-
-请提供：
-1. 主要情节
-2. 关键转折点
-3. 故事主题
-"""
-        return await self.generate(prompt)
+        # 静态说明放在剧本之前，作为可缓存前缀
+        prefix = render_template(self.SUMMARY_PROMPT_TEMPLATE, MAX_WORDS=str(max_words))
+        return await self.generate_cached(script, cached_prefix=prefix)
     
     def _extract_json(self, text: str) -> str:
         """从文本中提取JSON部分"""
-        # 尝试找到JSON代码块
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            return text[start:end].strip()
-        
-        if "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            return text[start:end].strip()
-        
-        # 尝试找到花括号包围的内容
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1:
-            return text[start:end+1]
-        
-        return text
+        return extract_json_text(text)
+
+
+# 全局配置的LLM服务实例，及创建时全局配置文件的修改时间
+_llm_service: Optional[LLMService] = None
+_llm_service_stamp: Optional[Tuple[Optional[float], ...]] = None
+
+
+def _global_config_stamp() -> Tuple[Optional[float], ...]:
+    """全局配置文件（yaml/json）的修改时间，文件不存在时为None"""
+    stamps = []
+    for path in Config.get_global_config_paths():
+        try:
+            stamps.append(path.stat().st_mtime)
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def get_llm_service() -> LLMService:
+    """
+    获取使用全局配置的LLM服务实例
+    
+    跨请求复用同一实例，免去每次请求重新读取、解析配置文件；
+    全局配置被保存（文件修改时间变化）后自动重建，提示词和提供商修改即时生效。
+    """
+    global _llm_service, _llm_service_stamp
+    stamp = _global_config_stamp()
+    if _llm_service is None or stamp != _llm_service_stamp:
+        _llm_service = LLMService()
+        _llm_service_stamp = stamp
+    return _llm_service
@@ -3,6 +3,11 @@
 将分镜数据与原始剧本结合，生成带有分镜设计和对话强调的新版剧本
 """
 
+import asyncio
+import io
+from collections import defaultdict
+from html import escape
+from operator import attrgetter
 from pathlib import Path
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -11,25 +16,74 @@ from src.models.schemas import Project, Character, Scene, Shot, ShotType, Camera
 from src.core.project_manager import ProjectManager
 
 
+# HTML头部（<title> 处拆开，中间写入项目名称）
+_HTML_HEAD_PREFIX = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>"""
+_HTML_HEAD_SUFFIX = """ - 分镜剧本</title>
+    <style>
+        body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; line-height: 1.6; max-width: 900px; margin: 0 auto; padding: 20px; color: #333; }
+        h1 { color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }
+        h2 { color: #34495e; margin-top: 30px; }
+        h3 { color: #7f8c8d; background: #ecf0f1; padding: 10px; border-radius: 5px; }
+        h4 { color: #2980b9; margin-top: 20px; }
+        .meta { color: #7f8c8d; font-size: 0.9em; margin-bottom: 20px; }
+        .character-list { background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0; }
+        .character-list li { margin: 5px 0; }
+        .shot { background: #fff; border: 1px solid #e0e0e0; border-radius: 8px; padding: 15px; margin: 15px 0; }
+        .shot-header { font-weight: bold; color: #2980b9; margin-bottom: 10px; }
+        .shot-meta { font-size: 0.85em; color: #666; margin-bottom: 10px; }
+        .shot-description { margin: 10px 0; }
+        .dialogue { 
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+            color: white; 
+            padding: 15px; 
+            border-radius: 8px; 
+            margin: 10px 0;
+            font-weight: 500;
+        }
+        .dialogue-label { font-size: 0.8em; opacity: 0.9; margin-bottom: 5px; }
+        .divider { border: none; border-top: 2px solid #ecf0f1; margin: 30px 0; }
+        .scene-info { background: #f1f3f4; padding: 10px 15px; border-radius: 5px; margin: 10px 0; }
+        .prompt { font-size: 0.8em; color: #95a5a6; font-style: italic; margin-top: 10px; }
+    </style>
+</head>
+<body>
+
+"""
+
+
+class _LabelMap(dict):
+    """中文名称映射：未收录的键原样返回（不必每次查找都传默认值）"""
+    
+    def __missing__(self, key: str) -> str:
+        return key
+
+
 class ScriptExportService:
     """分镜剧本导出服务"""
     
+    __slots__ = ("project_manager",)
+    
     # 镜头类型中文映射
-    SHOT_TYPE_NAMES = {
+    SHOT_TYPE_NAMES = _LabelMap({
         "wide": "全景",
         "medium": "中景",
         "close_up": "特写",
         "extreme_close_up": "大特写"
-    }
+    })
     
     # 镜头运动中文映射
-    CAMERA_MOVEMENT_NAMES = {
+    CAMERA_MOVEMENT_NAMES = _LabelMap({
         "static": "静止",
         "pan": "平移",
         "tilt": "倾斜",
         "zoom": "缩放",
         "tracking": "跟随"
-    }
+    })
     
     def __init__(self):
         self.project_manager = ProjectManager()
@@ -40,7 +94,8 @@ class ScriptExportService:
         include_dialogue: bool = True,
         include_camera_info: bool = True,
         include_action: bool = True,
-        format_type: str = "markdown"
+        format_type: str = "markdown",
+        timestamp: Optional[datetime] = None
     ) -> Dict[str, any]:
         """
         导出分镜剧本
@@ -51,6 +106,8 @@ class ScriptExportService:
             include_camera_info: 是否包含镜头信息
             include_action: 是否包含动作描述
             format_type: 输出格式 (markdown/html/docx)
+            timestamp: 生成时间（用于文档和文件名）；同一项目连续导出多种格式时传入同一时刻，
+                       文件名保持一致。默认为当前时间
         
         Returns:
             包含导出内容和文件路径的字典
@@ -64,40 +121,41 @@ class ScriptExportService:
         char_map = {c.character_id: c for c in characters}
         
         # 按场景分组分镜
-        shots_by_scene: Dict[str, List[Shot]] = {}
+        shots_by_scene: Dict[str, List[Shot]] = defaultdict(list)
         for shot in shots:
-            if shot.scene_id not in shots_by_scene:
-                shots_by_scene[shot.scene_id] = []
             shots_by_scene[shot.scene_id].append(shot)
         
-        # 按sequence排序
-        for scene_id in shots_by_scene:
-            shots_by_scene[scene_id].sort(key=lambda s: s.sequence)
+        # 按sequence排序（已按序存储时 timsort 只需一次线性扫描）
+        sequence_key = attrgetter("sequence")
+        for bucket in shots_by_scene.values():
+            bucket.sort(key=sequence_key)
         
-        # 生成剧本内容
+        # 生成剧本内容（生成时间与文件名共用同一时刻）
+        now = timestamp or datetime.now()
         if format_type == "markdown":
             content = self._generate_markdown(
                 project, scenes, shots_by_scene, char_map,
-                include_dialogue, include_camera_info, include_action
+                include_dialogue, include_camera_info, include_action, now
             )
         elif format_type == "html":
             content = self._generate_html(
                 project, scenes, shots_by_scene, char_map,
-                include_dialogue, include_camera_info, include_action
+                include_dialogue, include_camera_info, include_action, now
             )
         else:
             content = self._generate_markdown(
                 project, scenes, shots_by_scene, char_map,
-                include_dialogue, include_camera_info, include_action
+                include_dialogue, include_camera_info, include_action, now
             )
         
         # 保存文件
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         filename = f"{project.name}_分镜剧本_{timestamp}.{format_type if format_type != 'markdown' else 'md'}"
         output_path = Path(project.root_path) / "00_script" / filename
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # 一次性编码为UTF-8后按二进制写入（绕过文本层的逐块编码和换行转换），
+        # 在线程中写盘，大文档写入期间不阻塞事件循环
+        await asyncio.to_thread(output_path.write_bytes, content.encode('utf-8'))
         
         return {
             "success": True,
@@ -120,116 +178,116 @@ class ScriptExportService:
         char_map: Dict[str, Character],
         include_dialogue: bool,
         include_camera_info: bool,
-        include_action: bool
+        include_action: bool,
+        generated_at: datetime
     ) -> str:
         """生成Markdown格式的分镜剧本"""
         
-        lines = []
+        buf = io.StringIO()
+        write = buf.write
+        # 名称映射绑定为局部变量后传给逐分镜的格式化函数
+        shot_type_names = self.SHOT_TYPE_NAMES
+        movement_names = self.CAMERA_MOVEMENT_NAMES
+        # 角色ID到名称的映射只建一次，未知ID直接显示ID本身
+        names_by_id = {cid: c.name for cid, c in char_map.items()}
         
         # 标题
-        lines.append(f"# {project.name}")
-        lines.append(f"## 分镜剧本")
-        lines.append("")
-        lines.append(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"**风格**: {project.style_description}")
-        lines.append("")
-        lines.append("---")
-        lines.append("")
+        write(f"# {project.name}\n")
+        write("## 分镜剧本\n")
+        write("\n")
+        write(f"**生成时间**: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        write(f"**风格**: {project.style_description}\n")
+        write("\n")
+        write("---\n")
+        write("\n")
         
         # 角色表
-        lines.append("## 角色表")
-        lines.append("")
+        write("## 角色表\n")
+        write("\n")
         for char in char_map.values():
-            lines.append(f"- **{char.name}**: {char.description}")
-        lines.append("")
-        lines.append("---")
-        lines.append("")
+            write(f"- **{char.name}**: {char.description}\n")
+        write("\n")
+        write("---\n")
+        write("\n")
         
         # 按场景遍历
         for scene in scenes:
-            lines.append(f"## 场景 {scene.scene_id}: {scene.name}")
-            lines.append("")
-            lines.append(f"**地点**: {scene.location}")
-            lines.append(f"**时间**: {scene.time}")
+            write(f"## 场景 {scene.scene_id}: {scene.name}\n")
+            write("\n")
+            write(f"**地点**: {scene.location}\n")
+            write(f"**时间**: {scene.time}\n")
             if scene.atmosphere:
-                lines.append(f"**氛围**: {scene.atmosphere}")
-            lines.append(f"**描述**: {scene.description}")
-            lines.append("")
+                write(f"**氛围**: {scene.atmosphere}\n")
+            write(f"**描述**: {scene.description}\n")
+            write("\n")
             
             # 该场景的分镜
             scene_shots = shots_by_scene.get(scene.scene_id, [])
             if scene_shots:
-                lines.append(f"### 分镜列表 ({len(scene_shots)}个)")
-                lines.append("")
+                write(f"### 分镜列表 ({len(scene_shots)}个)\n")
+                write("\n")
                 
                 for shot in scene_shots:
-                    lines.extend(self._format_shot_markdown(
-                        shot, char_map, include_dialogue, include_camera_info, include_action
-                    ))
-                    lines.append("")
+                    self._format_shot_markdown(
+                        buf, shot, names_by_id, shot_type_names, movement_names,
+                        include_dialogue, include_camera_info, include_action
+                    )
+                    write("\n")
             else:
-                lines.append("*暂无分镜*")
-                lines.append("")
+                write("*暂无分镜*\n")
+                write("\n")
             
-            lines.append("---")
-            lines.append("")
+            write("---\n")
+            write("\n")
         
-        return "\n".join(lines)
+        # 去掉末尾多余的换行（与逐行 join 的输出一致）
+        buf.truncate(buf.tell() - 1)
+        return buf.getvalue()
     
     def _format_shot_markdown(
         self,
+        buf: io.StringIO,
         shot: Shot,
-        char_map: Dict[str, Character],
+        names_by_id: Dict[str, str],
+        shot_type_names: Dict[str, str],
+        movement_names: Dict[str, str],
         include_dialogue: bool,
         include_camera_info: bool,
         include_action: bool
-    ) -> List[str]:
-        """格式化单个分镜为Markdown"""
-        lines = []
-        
-        # 分镜标题
-        shot_type_name = self.SHOT_TYPE_NAMES.get(shot.type.value, shot.type.value)
-        lines.append(f"#### 分镜 {shot.sequence}: {shot_type_name}")
-        lines.append("")
+    ) -> None:
+        """格式化单个分镜为Markdown，整块拼成一个字符串后写入 buf"""
+        shot_type_name = shot_type_names[shot.type.value]
         
         # 镜头信息
+        camera_block = ""
         if include_camera_info:
-            movement_name = self.CAMERA_MOVEMENT_NAMES.get(shot.camera_movement.value, shot.camera_movement.value)
-            lines.append(f"**镜头**: {shot_type_name} | **运动**: {movement_name} | **时长**: {shot.duration.value}")
-            lines.append("")
+            movement_name = movement_names[shot.camera_movement.value]
+            camera_block = f"**镜头**: {shot_type_name} | **运动**: {movement_name} | **时长**: {shot.duration.value}\n\n"
         
         # 涉及角色
+        characters_block = ""
         if shot.characters:
-            char_names = [char_map.get(cid, Character(character_id=cid, name=cid, description="", personality="")).name 
-                         for cid in shot.characters]
-            lines.append(f"**角色**: {', '.join(char_names)}")
-            lines.append("")
-        
-        # 分镜描述
-        lines.append(f"**画面**: {shot.description}")
-        lines.append("")
+            char_names = [names_by_id.get(cid, cid) for cid in shot.characters]
+            characters_block = f"**角色**: {', '.join(char_names)}\n\n"
         
         # 动作描述
-        if include_action and shot.action:
-            lines.append(f"**动作**: {shot.action}")
-            lines.append("")
+        action_block = f"**动作**: {shot.action}\n\n" if include_action and shot.action else ""
         
-        # 对话（强调显示）
+        # 对话（强调显示，逐行引用）
+        dialogue_block = ""
         if include_dialogue and shot.dialogue:
-            lines.append("> 💬 **对话**")
-            lines.append(">")
-            # 处理多行对话
-            dialogue_lines = shot.dialogue.strip().split('\n')
-            for dline in dialogue_lines:
-                lines.append(f"> {dline}")
-            lines.append("")
+            quoted = "".join(f"> {dline}\n" for dline in shot.dialogue.strip().split('\n'))
+            dialogue_block = f"> 💬 **对话**\n>\n{quoted}\n"
         
         # 提示词（可选，简要显示）
-        if shot.image_prompt:
-            lines.append(f"*提示词: {shot.image_prompt.positive[:80]}...*")
-            lines.append("")
-        
-        return lines
+        prompt_block = f"*提示词: {shot.image_prompt.positive[:80]}...*\n\n" if shot.image_prompt else ""
+        
+        buf.write(
+            f"#### 分镜 {shot.sequence}: {shot_type_name}\n\n"
+            f"{camera_block}{characters_block}"
+            f"**画面**: {shot.description}\n\n"
+            f"{action_block}{dialogue_block}{prompt_block}"
+        )
     
     def _generate_html(
         self,
@@ -239,145 +297,129 @@ class ScriptExportService:
         char_map: Dict[str, Character],
         include_dialogue: bool,
         include_camera_info: bool,
-        include_action: bool
+        include_action: bool,
+        generated_at: datetime
     ) -> str:
         """生成HTML格式的分镜剧本"""
         
-        html_parts = []
+        buf = io.StringIO()
+        write = buf.write
+        # 名称映射绑定为局部变量后传给逐分镜的格式化函数
+        shot_type_names = self.SHOT_TYPE_NAMES
+        movement_names = self.CAMERA_MOVEMENT_NAMES
+        # 角色ID到名称的映射只建一次，未知ID直接显示ID本身
+        names_by_id = {cid: c.name for cid, c in char_map.items()}
         
         # HTML头部
-        html_parts.append("""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{} - 分镜剧本</title>
-    <style>
-        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; line-height: 1.6; max-width: 900px; margin: 0 auto; padding: 20px; color: #333; }}
-        h1 {{ color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }}
-        h2 {{ color: #34495e; margin-top: 30px; }}
-        h3 {{ color: #7f8c8d; background: #ecf0f1; padding: 10px; border-radius: 5px; }}
-        h4 {{ color: #2980b9; margin-top: 20px; }}
-        .meta {{ color: #7f8c8d; font-size: 0.9em; margin-bottom: 20px; }}
-        .character-list {{ background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0; }}
-        .character-list li {{ margin: 5px 0; }}
-        .shot {{ background: #fff; border: 1px solid #e0e0e0; border-radius: 8px; padding: 15px; margin: 15px 0; }}
-        .shot-header {{ font-weight: bold; color: #2980b9; margin-bottom: 10px; }}
-        .shot-meta {{ font-size: 0.85em; color: #666; margin-bottom: 10px; }}
-        .shot-description {{ margin: 10px 0; }}
-        .dialogue {{ 
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-            color: white; 
-            padding: 15px; 
-            border-radius: 8px; 
-            margin: 10px 0;
-            font-weight: 500;
-        }}
-        .dialogue-label {{ font-size: 0.8em; opacity: 0.9; margin-bottom: 5px; }}
-        .divider {{ border: none; border-top: 2px solid #ecf0f1; margin: 30px 0; }}
-        .scene-info {{ background: #f1f3f4; padding: 10px 15px; border-radius: 5px; margin: 10px 0; }}
-        .prompt {{ font-size: 0.8em; color: #95a5a6; font-style: italic; margin-top: 10px; }}
-    </style>
-</head>
-<body>
-""".format(project.name))
+        write(_HTML_HEAD_PREFIX)
+        write(escape(project.name))
+        write(_HTML_HEAD_SUFFIX)
         
         # 标题部分
-        html_parts.append(f"""
-    <h1>{project.name}</h1>
+        write(f"""
+    <h1>{escape(project.name)}</h1>
     <h2>分镜剧本</h2>
     <div class="meta">
-        <p><strong>生成时间</strong>: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        <p><strong>风格</strong>: {project.style_description}</p>
+        <p><strong>生成时间</strong>: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}</p>
+        <p><strong>风格</strong>: {escape(project.style_description)}</p>
     </div>
     <hr class="divider">
+
 """)
         
         # 角色表
-        html_parts.append("    <h2>角色表</h2>")
-        html_parts.append('    <ul class="character-list">')
+        write("    <h2>角色表</h2>\n")
+        write('    <ul class="character-list">\n')
         for char in char_map.values():
-            html_parts.append(f"        <li><strong>{char.name}</strong>: {char.description}</li>")
-        html_parts.append("    </ul>")
-        html_parts.append('    <hr class="divider">')
+            write(f"        <li><strong>{escape(char.name)}</strong>: {escape(char.description)}</li>\n")
+        write("    </ul>\n")
+        write('    <hr class="divider">\n')
         
         # 场景和分镜
         for scene in scenes:
-            html_parts.append(f"""
-    <h2>场景 {scene.scene_id}: {scene.name}</h2>
+            write(f"""
+    <h2>场景 {escape(scene.scene_id)}: {escape(scene.name)}</h2>
     <div class="scene-info">
-        <p><strong>地点</strong>: {scene.location} | <strong>时间</strong>: {scene.time}</p>
-        <p><strong>描述</strong>: {scene.description}</p>
+        <p><strong>地点</strong>: {escape(scene.location)} | <strong>时间</strong>: {escape(scene.time)}</p>
+        <p><strong>描述</strong>: {escape(scene.description)}</p>
     </div>
+
 """)
             
             scene_shots = shots_by_scene.get(scene.scene_id, [])
             if scene_shots:
-                html_parts.append(f"    <h3>分镜列表 ({len(scene_shots)}个)</h3>")
+                write(f"    <h3>分镜列表 ({len(scene_shots)}个)</h3>\n")
                 
                 for shot in scene_shots:
-                    html_parts.extend(self._format_shot_html(
-                        shot, char_map, include_dialogue, include_camera_info, include_action
+                    write(self._format_shot_html(
+                        shot, names_by_id, shot_type_names, movement_names,
+                        include_dialogue, include_camera_info, include_action
                     ))
+                    write("\n")
             else:
-                html_parts.append("    <p><em>暂无分镜</em></p>")
+                write("    <p><em>暂无分镜</em></p>\n")
             
-            html_parts.append('    <hr class="divider">')
+            write('    <hr class="divider">\n')
         
         # HTML尾部
-        html_parts.append("""
+        write("""
 </body>
 </html>
 """)
         
-        return "\n".join(html_parts)
+        return buf.getvalue()
     
     def _format_shot_html(
         self,
         shot: Shot,
-        char_map: Dict[str, Character],
+        names_by_id: Dict[str, str],
+        shot_type_names: Dict[str, str],
+        movement_names: Dict[str, str],
         include_dialogue: bool,
         include_camera_info: bool,
         include_action: bool
-    ) -> List[str]:
-        """格式化单个分镜为HTML"""
-        lines = []
-        
-        shot_type_name = self.SHOT_TYPE_NAMES.get(shot.type.value, shot.type.value)
-        
-        lines.append('    <div class="shot">')
-        lines.append(f'        <div class="shot-header">分镜 {shot.sequence}: {shot_type_name}</div>')
+    ) -> str:
+        """格式化单个分镜为HTML（整块一个字符串，行间以换行分隔）"""
+        shot_type_name = shot_type_names[shot.type.value]
         
         # 镜头信息
+        camera_block = ""
         if include_camera_info:
-            movement_name = self.CAMERA_MOVEMENT_NAMES.get(shot.camera_movement.value, shot.camera_movement.value)
-            lines.append(f'        <div class="shot-meta">镜头: {shot_type_name} | 运动: {movement_name} | 时长: {shot.duration.value}</div>')
+            movement_name = movement_names[shot.camera_movement.value]
+            camera_block = f'\n        <div class="shot-meta">镜头: {shot_type_name} | 运动: {movement_name} | 时长: {shot.duration.value}</div>'
         
         # 角色
+        characters_block = ""
         if shot.characters:
-            char_names = [char_map.get(cid, Character(character_id=cid, name=cid, description="", personality="")).name 
-                         for cid in shot.characters]
-            lines.append(f'        <div class="shot-meta">角色: {", ".join(char_names)}</div>')
-        
-        # 描述
-        lines.append(f'        <div class="shot-description"><strong>画面</strong>: {shot.description}</div>')
+            char_names = [names_by_id.get(cid, cid) for cid in shot.characters]
+            characters_block = f'\n        <div class="shot-meta">角色: {escape(", ".join(char_names))}</div>'
         
         # 动作
+        action_block = ""
         if include_action and shot.action:
-            lines.append(f'        <div class="shot-description"><strong>动作</strong>: {shot.action}</div>')
+            action_block = f'\n        <div class="shot-description"><strong>动作</strong>: {escape(shot.action)}</div>'
         
         # 对话（强调显示）
+        dialogue_block = ""
         if include_dialogue and shot.dialogue:
-            dialogue_html = shot.dialogue.strip().replace('\n', '<br>')
-            lines.append('        <div class="dialogue">')
-            lines.append('            <div class="dialogue-label">💬 对话</div>')
-            lines.append(f'            <div>{dialogue_html}</div>')
-            lines.append('        </div>')
+            dialogue_html = escape(shot.dialogue.strip()).replace('\n', '<br>')
+            dialogue_block = (
+                '\n        <div class="dialogue">'
+                '\n            <div class="dialogue-label">💬 对话</div>'
+                f'\n            <div>{dialogue_html}</div>'
+                '\n        </div>'
+            )
         
         # 提示词
+        prompt_block = ""
         if shot.image_prompt:
-            lines.append(f'        <div class="prompt">提示词: {shot.image_prompt.positive[:80]}...</div>')
-        
-        lines.append('    </div>')
-        
-        return lines
+            prompt_block = f'\n        <div class="prompt">提示词: {escape(shot.image_prompt.positive[:80])}...</div>'
+        
+        return (
+            '    <div class="shot">'
+            f'\n        <div class="shot-header">分镜 {shot.sequence}: {shot_type_name}</div>'
+            f"{camera_block}{characters_block}"
+            f'\n        <div class="shot-description"><strong>画面</strong>: {escape(shot.description)}</div>'
+            f"{action_block}{dialogue_block}{prompt_block}"
+            '\n    </div>'
+        )
@@ -3,28 +3,49 @@
 根据场景和角色自动生成分镜
 """
 
+import asyncio
 import json
-from typing import List, Dict, Optional
+import logging
+from bisect import bisect_right
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
 
 from src.core.config import Config
 from src.models.schemas import Scene, Character, Shot, ShotType, CameraMovement, VideoDuration, ImagePrompt, VideoPrompt
-from src.services.llm_service import LLMService
+from src.services.llm_service import LLMService, extract_json_text, parse_json_response, render_template
+
+logger = logging.getLogger(__name__)
 
 
 class ShotDesignService:
     """分镜设计服务"""
     
+    __slots__ = ("config", "llm_service", "_image_parameters")
+    
+    # 场景描述字数分档（<50 / <150 / <300 / 其余）及对应的估算分镜数
+    SHOT_COUNT_LENGTH_THRESHOLDS = (50, 150, 300)
+    SHOT_COUNT_BY_LENGTH = (2, 3, 4, 5)
+    
+    # LLM解析失败时的默认分镜: (type, 描述模板, action)，模板参数为 scene 和 chars
+    DEFAULT_SHOT_TEMPLATES = (
+        ("wide", "{scene}全景，展示{chars}", "场景介绍"),
+        ("medium", "{chars}中景对话", "对话交流"),
+    )
+    
     def __init__(self, config: Optional[Config] = None):
         self.config = config or Config.load_global()
         self.llm_service = LLMService(self.config)
+        # 图片生成默认参数（每个分镜的 ImagePrompt 都要用到，初始化时读取一次）
+        image_defaults = self.config.defaults.image
+        self._image_parameters = (image_defaults.default_steps, image_defaults.default_cfg)
     
     async def design_shots_for_scene(
         self,
         scene: Scene,
         characters: List[Character],
         style_description: str,
-        script_segment: str
+        script_segment: str,
+        use_cache: bool = True
     ) -> List[Shot]:
         """
         为单个场景设计分镜
@@ -34,6 +55,7 @@ class ShotDesignService:
             characters: 场景中的角色列表
             style_description: 风格描述
             script_segment: 剧本片段
+            use_cache: 是否使用LLM响应缓存（需开启 LLM_RESPONSE_CACHE）；为False时强制重新生成
         
         Returns:
             分镜列表
@@ -44,69 +66,56 @@ class ShotDesignService:
             for c in characters
         ])
         
-        # 构建提示词（使用 replace 避免 format 的 KeyError 问题）
-        prompt_template = self.config.prompts.get("shot_design", "")
-        
-        # 安全替换占位符（统一使用 [[VAR]] 格式）
-        replacements = {
-            "[[SCENE_NAME]]": scene.name,
-            "[[SCENE_DESCRIPTION]]": scene.description,
-            "[[CHARACTERS]]": char_info,
-            "[[SCRIPT_SEGMENT]]": script_segment
-        }
-        
-        prompt = prompt_template
-        for placeholder, value in replacements.items():
-            prompt = prompt.replace(placeholder, value)
+        # 构建提示词（[[VAR]] 占位符一次遍历填充，避免 format 的 KeyError 问题）
+        prompt = render_template(
+            self.config.prompts.get("shot_design", ""),
+            SCENE_NAME=scene.name,
+            SCENE_DESCRIPTION=scene.description,
+            CHARACTERS=char_info,
+            SCRIPT_SEGMENT=script_segment
+        )
         
         # ============ 调试输出：分镜设计输入 ============
-        print("\n" + "="*60)
-        print(f"🎥 分镜设计 - 场景: {scene.name}")
-        print("="*60)
-        print(f"场景ID: {scene.scene_id}")
-        print(f"场景描述: {scene.description[:100]}...")
-        print(f"角色数量: {len(characters)} 个")
-        for c in characters:
-            print(f"   - {c.name}")
-        print(f"剧本片段长度: {len(script_segment)} 字符")
-        print("-"*60)
-        print("剧本片段预览:")
-        print(script_segment[:500] + "..." if len(script_segment) > 500 else script_segment)
-        print("-"*60)
-        print("LLM Prompt 预览 (前1500字符):")
-        print(prompt[:1500] + "..." if len(prompt) > 1500 else prompt)
-        print("="*60 + "\n")
-        
-        # 调用LLM生成分镜
-        response = await self.llm_service.generate(prompt)
+        # 关闭DEBUG时跳过预览字符串的切片和拼接
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🎥 分镜设计 - 场景: %s (%s)\n场景描述: %s...\n角色(%d): %s\n剧本片段长度: %d 字符\n"
+                "剧本片段预览:\n%s\nLLM Prompt 预览 (前1500字符):\n%s",
+                scene.name, scene.scene_id, scene.description[:100],
+                len(characters), ", ".join(c.name for c in characters), len(script_segment),
+                script_segment[:500] + "..." if len(script_segment) > 500 else script_segment,
+                prompt[:1500] + "..." if len(prompt) > 1500 else prompt,
+            )
+        
+        # 调用LLM生成分镜（相同输入重复运行时命中响应缓存）
+        response = await self._ask_llm(prompt, use_cache, validate=self.llm_service.is_json_response)
         
         # ============ 调试输出：分镜设计输出 ============
-        print("\n" + "="*60)
-        print(f"🎥 分镜设计 - LLM响应")
-        print("="*60)
-        print(f"响应长度: {len(response)} 字符")
-        print("-"*60)
-        print(response[:2000] + "..." if len(response) > 2000 else response)
-        print("="*60 + "\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🎥 分镜设计 - LLM响应 (%d 字符):\n%s",
+                len(response), response[:2000] + "..." if len(response) > 2000 else response,
+            )
         
         # 解析JSON响应
         try:
-            data = json.loads(self._extract_json(response))
+            data = parse_json_response(response)
             shots_data = data.get("shots", [])
             
-            print(f"✅ 场景 {scene.scene_id} 成功解析分镜: {len(shots_data)} 个")
-            for i, shot in enumerate(shots_data, 1):
-                print(f"   {i}. {shot.get('type', 'N/A')} | {shot.get('description', 'N/A')[:60]}...")
+            logger.debug("✅ 场景 %s 成功解析分镜: %d 个", scene.scene_id, len(shots_data))
         except json.JSONDecodeError as e:
-            print(f"❌ 场景 {scene.scene_id} 分镜JSON解析失败: {e}")
-            print(f"   尝试解析内容: {self._extract_json(response)[:500]}")
-            print(f"   将使用默认分镜")
+            logger.warning("❌ 场景 %s 分镜JSON解析失败，将使用默认分镜: %s", scene.scene_id, e)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   尝试解析内容: %s", self._extract_json(response)[:500])
             # 如果解析失败，创建默认分镜
             shots_data = self._create_default_shots(scene, characters)
         
         # 构建Shot对象
         shots = []
-        scene_character_ids = {c.character_id for c in characters}  # 场景所有角色ID集合
+        all_character_ids = [c.character_id for c in characters]
+        scene_character_ids = set(all_character_ids)  # 场景所有角色ID集合
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        debug_lines = [] if debug_enabled else None
         
         for i, shot_data in enumerate(shots_data):
             # 获取该分镜涉及的角色ID（处理字符串或列表格式）
@@ -127,17 +136,18 @@ class ShotDesignService:
                 if cid in scene_character_ids
             ]
             
-            # 调试输出：显示character_ids处理过程
-            print(f"   🎭 分镜 {scene.scene_id}_shot_{i+1:03d} 角色处理:")
-            print(f"      原始character_ids: {raw_character_ids} (类型: {type(raw_character_ids).__name__})")
-            print(f"      场景可用角色: {scene_character_ids}")
-            
             # 如果没有返回有效角色，默认使用该场景所有角色（兼容旧逻辑）
-            if not valid_character_ids:
-                valid_character_ids = [c.character_id for c in characters]
-                print(f"      ⚠️ 未匹配到有效角色，使用场景所有角色: {valid_character_ids}")
-            else:
-                print(f"      ✅ 匹配到角色: {valid_character_ids}")
+            matched = bool(valid_character_ids)
+            if not matched:
+                # Shot 校验 characters 时会复制列表，各分镜之间不会共享
+                valid_character_ids = all_character_ids
+            
+            if debug_enabled:
+                debug_lines.append(
+                    f"   {i+1}. {shot_data.get('type', 'N/A')} | {str(shot_data.get('description', 'N/A'))[:60]} | "
+                    f"原始character_ids: {raw_character_ids!r} -> "
+                    f"{'✅ ' if matched else '⚠️ 未匹配，使用场景所有角色 '}{valid_character_ids}"
+                )
             
             shot = Shot(
                 shot_id=f"{scene.scene_id}_shot_{i+1:03d}",
@@ -153,38 +163,95 @@ class ShotDesignService:
             )
             shots.append(shot)
         
+        if debug_lines:
+            logger.debug("🎭 场景 %s 分镜及角色处理:\n%s", scene.scene_id, "\n".join(debug_lines))
+        
         return shots
     
+    async def design_all_scenes(
+        self,
+        scenes: List[Scene],
+        characters_by_scene: Dict[str, List[Character]],
+        style_description: str,
+        segments: Dict[str, str],
+        max_concurrency: Optional[int] = None,
+        use_cache: bool = True
+    ) -> List[List[Shot]]:
+        """
+        并发为所有场景设计分镜，并为每个分镜生成提示词
+        
+        各场景的分镜设计、各分镜的提示词生成互不依赖，并发数受 max_concurrency 限制
+        （默认 llm_workers）。信号量只包住单次设计/提示词生成，场景任务等待分镜提示词时
+        不占用许可，不会出现外层任务占满许可而内层无法执行的情况。
+        
+        Args:
+            scenes: 场景列表
+            characters_by_scene: 场景ID -> 场景中的角色列表
+            style_description: 风格描述
+            segments: 场景ID -> 剧本片段
+            max_concurrency: 最大并发LLM调用数
+            use_cache: 是否使用LLM响应缓存；重新设计时传False，确保重新请求LLM
+        
+        Returns:
+            与 scenes 顺序一致的分镜列表（已生成提示词）
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.config.defaults.concurrency.llm_workers)
+        
+        async def prompts_for(shot: Shot, scene: Scene, scene_chars: List[Character]) -> Shot:
+            async with semaphore:
+                return await self.generate_shot_prompts(
+                    shot, scene_chars, scene, style_description, use_cache=use_cache
+                )
+        
+        async def design_scene(scene: Scene) -> List[Shot]:
+            scene_chars = characters_by_scene[scene.scene_id]
+            async with semaphore:
+                shots = await self.design_shots_for_scene(
+                    scene, scene_chars, style_description, segments[scene.scene_id], use_cache=use_cache
+                )
+            return list(await asyncio.gather(*(prompts_for(shot, scene, scene_chars) for shot in shots)))
+        
+        return list(await asyncio.gather(*(design_scene(scene) for scene in scenes)))
+    
     async def generate_shot_prompts(
         self,
         shot: Shot,
         characters: List[Character],
         scene: Scene,
-        style_description: str
+        style_description: str,
+        use_cache: bool = True
     ) -> Shot:
         """
         为分镜生成图片和视频提示词
         
+        一次LLM调用同时生成两者；合并响应无法解析时退回分别生成。
+        
         Args:
             shot: 分镜对象
             characters: 角色列表
             scene: 场景对象
             style_description: 风格描述
+            use_cache: 是否使用LLM响应缓存；为False时强制重新生成
         
         Returns:
             更新后的分镜对象
         """
-        # 生成图片提示词
-        image_prompt = await self._generate_image_prompt(
-            shot, characters, scene, style_description
-        )
-        shot.image_prompt = image_prompt
-        
-        # 生成视频提示词
-        video_prompt = await self._generate_video_prompt(
-            shot, scene, characters, style_description
-        )
-        shot.video_prompt = video_prompt
+        prompts = await self._generate_combined_prompts(shot, characters, scene, style_description, use_cache)
+        if prompts is not None:
+            image_prompt, video_prompt = prompts
+            shot.image_prompt = image_prompt
+            shot.video_prompt = video_prompt
+        else:
+            # 生成图片提示词
+            image_prompt = await self._generate_image_prompt(
+                shot, characters, scene, style_description, use_cache
+            )
+            shot.image_prompt = image_prompt
+            
+            # 生成视频提示词（依赖首帧图片提示词）
+            shot.video_prompt = await self._generate_video_prompt(
+                shot, scene, characters, style_description, use_cache
+            )
         
         # 构建完整显示提示词
         shot.display_prompt = self._build_display_prompt(
@@ -194,14 +261,83 @@ class ShotDesignService:
         shot.updated_at = datetime.now()
         return shot
     
-    async def _generate_image_prompt(
+    async def _generate_combined_prompts(
+        self,
+        shot: Shot,
+        characters: List[Character],
+        scene: Scene,
+        style_description: str,
+        use_cache: bool = True
+    ) -> Optional[Tuple[ImagePrompt, VideoPrompt]]:
+        """
+        一次LLM调用同时生成图片和视频提示词
+        
+        视频模板中的 [[IMAGE_PROMPT]] 指向同一响应中任务一的结果。
+        
+        Returns:
+            (图片提示词, 视频提示词)，响应无法解析时返回None
+        """
+        image_task = self._build_image_prompt_text(shot, characters, scene, style_description).strip()
+        video_task = self._build_video_prompt_text(
+            shot, scene, characters, "（即任务一生成的 positive 正面提示词）"
+        ).strip()
+        prompt = (
+            "请针对同一个分镜一次性完成以下两项任务。\n\n"
+            f"# 任务一：首帧图片提示词\n{image_task}\n\n"
+            f"# 任务二：视频提示词\n{video_task}\n\n"
+            "# 最终输出格式\n"
+            "只输出一个JSON对象，同时包含两项任务的结果：\n"
+            '{"image": {"positive": "正面提示词", "negative": "负面提示词"}, "video": "视频描述文本"}\n'
+        )
+        
+        # ============ 调试输出：图片+视频提示词生成 ============
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🖼️🎬 生成图片+视频提示词 - %s: %s...", shot.shot_id, shot.description[:60])
+        
+        response = await self._ask_llm(prompt, use_cache, validate=self.llm_service.is_json_response)
+        
+        try:
+            data = parse_json_response(response)
+            image_data = data["image"]
+            video_desc = data["video"].strip()
+            if not video_desc:
+                raise ValueError("视频描述为空")
+            image_prompt = self._make_image_prompt(image_data)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("❌ %s 合并提示词解析失败 (%s)，改为分别生成", shot.shot_id, e)
+            return None
+        
+        logger.debug(
+            "✅ %s 成功生成图片提示词 (positive: %d 字符) 和视频提示词 (%d 字符)",
+            shot.shot_id, len(image_prompt.positive), len(video_desc),
+        )
+        
+        return image_prompt, VideoPrompt(
+            description=video_desc,
+            camera=shot.camera_movement.value if shot.camera_movement else "static"
+        )
+    
+    def _make_image_prompt(self, data: Dict) -> ImagePrompt:
+        """由LLM返回的 {"positive", "negative"} 构建图片提示词"""
+        steps, cfg_scale = self._image_parameters
+        return ImagePrompt(
+            positive=data.get("positive", ""),
+            negative=data.get("negative", ""),
+            parameters={
+                "seed": None,
+                "steps": steps,
+                "cfg_scale": cfg_scale
+            }
+        )
+    
+    def _build_image_prompt_text(
         self,
         shot: Shot,
         characters: List[Character],
         scene: Scene,
         style_description: str
-    ) -> ImagePrompt:
-        """生成图片提示词"""
+    ) -> str:
+        """构建图片提示词生成指令"""
         
         # 构建角色描述
         char_descriptions = "\n".join([
@@ -214,14 +350,16 @@ class ShotDesignService:
         
         if prompt_template and "[[SHOT_DESCRIPTION]]" in prompt_template:
             # 使用模板并替换占位符
-            prompt = prompt_template
-            prompt = prompt.replace("[[SHOT_DESCRIPTION]]", shot.description or "")
-            prompt = prompt.replace("[[CHARACTERS]]", char_descriptions)
-            prompt = prompt.replace("[[SCENE_REF]]", scene.description or "")
-            prompt = prompt.replace("[[STYLE]]", style_description or "")
-        else:
-            # 回退到默认硬编码（兼容旧配置）
-            prompt = f"""
+            return render_template(
+                prompt_template,
+                SHOT_DESCRIPTION=shot.description or "",
+                CHARACTERS=char_descriptions,
+                SCENE_REF=scene.description or "",
+                STYLE=style_description or ""
+            )
+        
+        # 回退到默认硬编码（兼容旧配置）
+        return f"""
 基于以下信息生成AI图片生成提示词：
 
 分镜描述: {shot.description}
@@ -240,49 +378,15 @@ class ShotDesignService:
     "negative": "负面提示词"
 }}
 """
-        
-        # ============ 调试输出：图片提示词生成 ============
-        print(f"\n🖼️  生成图片提示词 - {shot.shot_id}")
-        print(f"   分镜描述: {shot.description[:60]}...")
-        print(f"   Prompt预览: {prompt[:200]}...")
-        
-        response = await self.llm_service.generate(prompt)
-        
-        # ============ 调试输出：图片提示词响应 ============
-        print(f"   LLM响应: {response[:200]}...")
-        
-        try:
-            data = json.loads(self._extract_json(response))
-            positive = data.get("positive", "")
-            negative = data.get("negative", "")
-            
-            print(f"   ✅ 成功生成图片提示词 (positive: {len(positive)} 字符, negative: {len(negative)} 字符)")
-            
-            return ImagePrompt(
-                positive=positive,
-                negative=negative,
-                parameters={
-                    "seed": None,
-                    "steps": self.config.defaults.image.default_steps,
-                    "cfg_scale": self.config.defaults.image.default_cfg
-                }
-            )
-        except json.JSONDecodeError:
-            print(f"   ❌ 图片提示词JSON解析失败，使用默认提示词")
-            # 返回默认提示词
-            return ImagePrompt(
-                positive=f"{shot.description}, {style_description}, high quality, detailed",
-                negative="bad anatomy, bad hands, worst quality, low quality"
-            )
     
-    async def _generate_video_prompt(
+    def _build_video_prompt_text(
         self,
         shot: Shot,
         scene: Scene,
         characters: List[Character],
-        style_description: str
-    ) -> VideoPrompt:
-        """生成视频提示词"""
+        image_prompt_text: str
+    ) -> str:
+        """构建视频提示词生成指令"""
         
         # 获取配置模板
         prompt_template = self.config.prompts.get("video_prompt", "")
@@ -293,23 +397,20 @@ class ShotDesignService:
             for c in characters
         ])
         
-        # 获取首帧提示词
-        image_prompt_text = ""
-        if shot.image_prompt:
-            image_prompt_text = shot.image_prompt.positive
-        
         if prompt_template and "[[" in prompt_template:
             # 使用模板并替换占位符
-            prompt = prompt_template
-            prompt = prompt.replace("[[SCENE_DESCRIPTION]]", scene.description or "")
-            prompt = prompt.replace("[[IMAGE_PROMPT]]", image_prompt_text)
-            prompt = prompt.replace("[[CHARACTERS]]", characters_desc)
-            prompt = prompt.replace("[[ACTION]]", shot.action or "无")
-            prompt = prompt.replace("[[CAMERA_MOVEMENT]]", shot.camera_movement.value if shot.camera_movement else "static")
-            prompt = prompt.replace("[[DURATION]]", shot.duration.value if shot.duration else "5s")
-        else:
-            # 回退到默认硬编码（兼容旧配置）
-            prompt = f"""
+            return render_template(
+                prompt_template,
+                SCENE_DESCRIPTION=scene.description or "",
+                IMAGE_PROMPT=image_prompt_text,
+                CHARACTERS=characters_desc,
+                ACTION=shot.action or "无",
+                CAMERA_MOVEMENT=shot.camera_movement.value if shot.camera_movement else "static",
+                DURATION=shot.duration.value if shot.duration else "5s"
+            )
+        
+        # 回退到默认硬编码（兼容旧配置）
+        return f"""
 基于以下分镜信息生成视频生成提示词：
 
 分镜描述: {shot.description}
@@ -326,17 +427,78 @@ class ShotDesignService:
 - 视频描述（50-100字）
 - 相机运动说明
 """
+    
+    async def _generate_image_prompt(
+        self,
+        shot: Shot,
+        characters: List[Character],
+        scene: Scene,
+        style_description: str,
+        use_cache: bool = True
+    ) -> ImagePrompt:
+        """生成图片提示词"""
+        prompt = self._build_image_prompt_text(shot, characters, scene, style_description)
+        
+        # ============ 调试输出：图片提示词生成 ============
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🖼️  生成图片提示词 - %s: %s...\n   Prompt预览: %s...",
+                shot.shot_id, shot.description[:60], prompt[:200],
+            )
+        
+        response = await self._ask_llm(prompt, use_cache, validate=self.llm_service.is_json_response)
+        
+        # ============ 调试输出：图片提示词响应 ============
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("   LLM响应: %s...", response[:200])
+        
+        try:
+            image_prompt = self._make_image_prompt(parse_json_response(response))
+            
+            logger.debug(
+                "✅ %s 成功生成图片提示词 (positive: %d 字符, negative: %d 字符)",
+                shot.shot_id, len(image_prompt.positive), len(image_prompt.negative),
+            )
+            
+            return image_prompt
+        except json.JSONDecodeError:
+            logger.warning("❌ %s 图片提示词JSON解析失败，使用默认提示词", shot.shot_id)
+            # 返回默认提示词
+            return ImagePrompt(
+                positive=f"{shot.description}, {style_description}, high quality, detailed",
+                negative="bad anatomy, bad hands, worst quality, low quality"
+            )
+    
+    async def _generate_video_prompt(
+        self,
+        shot: Shot,
+        scene: Scene,
+        characters: List[Character],
+        style_description: str,
+        use_cache: bool = True
+    ) -> VideoPrompt:
+        """生成视频提示词"""
+        
+        # 获取首帧提示词
+        image_prompt_text = ""
+        if shot.image_prompt:
+            image_prompt_text = shot.image_prompt.positive
+        
+        prompt = self._build_video_prompt_text(shot, scene, characters, image_prompt_text)
         
         # ============ 调试输出：视频提示词生成 ============
-        print(f"\n🎬 生成视频提示词 - {shot.shot_id}")
-        print(f"   分镜动作: {shot.action[:60] if shot.action else 'N/A'}...")
-        print(f"   Prompt预览: {prompt[:200]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🎬 生成视频提示词 - %s: %s...\n   Prompt预览: %s...",
+                shot.shot_id, shot.action[:60] if shot.action else "N/A", prompt[:200],
+            )
         
-        response = await self.llm_service.generate(prompt)
+        response = await self._ask_llm(prompt, use_cache)
         
         # ============ 调试输出：视频提示词响应 ============
         video_desc = response.strip()
-        print(f"   ✅ 成功生成视频提示词 ({len(video_desc)} 字符): {video_desc[:100]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("✅ %s 成功生成视频提示词 (%d 字符): %s...", shot.shot_id, len(video_desc), video_desc[:100])
         
         return VideoPrompt(
             description=video_desc,
@@ -361,24 +523,20 @@ class ShotDesignService:
         ]
         return "\n\n".join(parts)
     
+    async def _ask_llm(
+        self,
+        prompt: str,
+        use_cache: bool,
+        validate: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """调用LLM；use_cache 为True时走响应缓存（需开启 LLM_RESPONSE_CACHE），否则总是重新请求"""
+        if use_cache:
+            return await self.llm_service.generate_cached(prompt, validate=validate)
+        return await self.llm_service.generate(prompt)
+    
     def _extract_json(self, text: str) -> str:
-        """从文本中提取JSON"""
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            return text[start:end].strip()
-        
-        if "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            return text[start:end].strip()
-        
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1:
-            return text[start:end+1]
-        
-        return text
+        """从文本中提取JSON（与LLM服务共用单次扫描、带缓存的提取逻辑）"""
+        return extract_json_text(text)
     
     def _create_default_shots(self, scene: Scene, characters: List[Character]) -> List[Dict]:
         """创建默认分镜（当LLM解析失败时使用）"""
@@ -386,32 +544,17 @@ class ShotDesignService:
         
         return [
             {
-                "type": "wide",
+                "type": shot_type,
                 "camera_movement": "static",
                 "duration": "5s",
-                "description": f"{scene.name}全景，展示{char_names}",
-                "action": "场景介绍",
-                "dialogue": None
-            },
-            {
-                "type": "medium",
-                "camera_movement": "static",
-                "duration": "5s",
-                "description": f"{char_names}中景对话",
-                "action": "对话交流",
+                "description": description.format(scene=scene.name, chars=char_names),
+                "action": action,
                 "dialogue": None
             }
+            for shot_type, description, action in self.DEFAULT_SHOT_TEMPLATES
         ]
     
     def estimate_shot_count(self, scene_description: str) -> int:
         """估算场景需要的分镜数（基于描述复杂度）"""
-        # 简单启发式：根据字数估算
-        length = len(scene_description)
-        if length < 50:
-            return 2
-        elif length < 150:
-            return 3
-        elif length < 300:
-            return 4
-        else:
-            return 5
+        # 简单启发式：根据字数所在区间查表
+        return self.SHOT_COUNT_BY_LENGTH[bisect_right(self.SHOT_COUNT_LENGTH_THRESHOLDS, len(scene_description))]
@@ -2,10 +2,13 @@
 统一视频服务
 支持多提供商，自动选择/切换
 """
+import asyncio
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 
+import aiohttp
+
 from .providers import create_video_provider, get_available_providers
 from .providers.base import (
     VideoGenerationRequest, VideoGenerationResult,
@@ -16,6 +19,28 @@ from .providers.base import (
 class VideoService:
     """统一视频服务"""
     
+    # 下载连接池：同一CDN的多次下载复用 keep-alive 连接，省去重复的DNS/TCP/TLS握手
+    DOWNLOAD_CONNECTION_LIMIT = 32
+    DOWNLOAD_CONNECTION_LIMIT_PER_HOST = 8
+    DOWNLOAD_KEEPALIVE_TIMEOUT = 60
+    DOWNLOAD_CHUNK_SIZE = 1 << 16  # 64KB
+    DOWNLOAD_CONCURRENCY = 8  # 批量下载的并发数，与单host连接数一致
+    
+    # 时长/分辨率标准化映射（未列出的取值回退到 4s / 720p）
+    DURATION_MAP: Dict[str, VideoDuration] = {
+        "4s": VideoDuration.SECONDS_4,
+        "8s": VideoDuration.SECONDS_8,
+        "12s": VideoDuration.SECONDS_12,
+    }
+    RESOLUTION_MAP: Dict[str, VideoResolution] = {
+        # 直接映射到 API 支持的格式
+        "720p": VideoResolution.P720,
+        "1080p": VideoResolution.P1080,
+        # 兼容旧格式
+        "1280x720": VideoResolution.P720,
+        "1920x1080": VideoResolution.P1080,
+    }
+    
     def __init__(self, config: Optional[Dict] = None):
         """
         初始化视频服务
@@ -30,8 +55,11 @@ class VideoService:
         self.default_provider_type = config.get("default", "jiekouai")
         self.default_provider = self._create_provider(self.default_provider_type)
         
-        # 活跃任务映射: task_id -> provider
-        self.active_tasks: Dict[str, Any] = {}
+        # 已创建的提供商实例: provider_type -> provider（同一服务内按类型复用）
+        self._providers: Dict[str, Any] = {self.default_provider_type: self.default_provider}
+        
+        # 视频下载共享 session（首次下载时创建）
+        self._download_session: Optional[aiohttp.ClientSession] = None
     
     def _load_config_from_env(self) -> Dict:
         """从环境变量加载配置"""
@@ -50,31 +78,25 @@ class VideoService:
         provider_config = self.config.get(provider_type, {})
         return create_video_provider(provider_type, provider_config)
     
+    def _get_provider(self, provider_type: str):
+        """获取提供商实例，同类型只创建一次"""
+        provider = self._providers.get(provider_type)
+        if provider is None:
+            provider = self._providers[provider_type] = self._create_provider(provider_type)
+        return provider
+    
     def _normalize_duration(self, duration: str) -> VideoDuration:
         """标准化时长"""
-        duration_map = {
-            "4s": VideoDuration.SECONDS_4,
-            "8s": VideoDuration.SECONDS_8,
-            "12s": VideoDuration.SECONDS_12,
-        }
-        return duration_map.get(duration, VideoDuration.SECONDS_4)
+        return self.DURATION_MAP.get(duration, VideoDuration.SECONDS_4)
     
     def _normalize_resolution(self, size: str) -> VideoResolution:
         """标准化分辨率"""
-        # 直接映射到 API 支持的格式
-        resolution_map = {
-            "720p": VideoResolution.P720,
-            "1080p": VideoResolution.P1080,
-            # 兼容旧格式
-            "1280x720": VideoResolution.P720,
-            "1920x1080": VideoResolution.P1080,
-        }
-        return resolution_map.get(size, VideoResolution.P720)
+        return self.RESOLUTION_MAP.get(size, VideoResolution.P720)
     
     def get_capabilities(self, provider: Optional[str] = None) -> Dict[str, Any]:
         """获取提供商能力"""
         if provider:
-            p = self._create_provider(provider)
+            p = self._get_provider(provider)
         else:
             p = self.default_provider
         return p.get_capabilities()
@@ -106,7 +128,7 @@ class VideoService:
         """
         # 选择提供商
         if provider:
-            video_provider = self._create_provider(provider)
+            video_provider = self._get_provider(provider)
         else:
             video_provider = self.default_provider
         
@@ -121,22 +143,30 @@ class VideoService:
         )
         
         # 提交任务
-        result = await video_provider.generate_video(request)
-        
-        # 记录任务对应的提供商
-        if result.task_id:
-            self.active_tasks[result.task_id] = video_provider
-        
-        return result
+        return await video_provider.generate_video(request)
     
-    async def check_status(self, task_id: str) -> VideoGenerationResult:
+    async def check_status(self, task_id: str, provider: Optional[str] = None) -> VideoGenerationResult:
         """
         检查任务状态
         
-        自动路由到正确的提供商
+        Args:
+            task_id: 提供商返回的任务ID
+            provider: 提交任务时使用的提供商，默认使用配置中的默认提供商
         """
-        provider = self.active_tasks.get(task_id, self.default_provider)
-        return await provider.check_status(task_id)
+        video_provider = self._get_provider(provider) if provider else self.default_provider
+        return await video_provider.check_status(task_id)
+    
+    def _get_download_session(self) -> aiohttp.ClientSession:
+        """获取或创建下载用的共享 session"""
+        if self._download_session is None or self._download_session.closed:
+            self._download_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.DOWNLOAD_CONNECTION_LIMIT,
+                    limit_per_host=self.DOWNLOAD_CONNECTION_LIMIT_PER_HOST,
+                    keepalive_timeout=self.DOWNLOAD_KEEPALIVE_TIMEOUT
+                )
+            )
+        return self._download_session
     
     async def download_video(self, video_url: str, output_path: str) -> bool:
         """
@@ -149,34 +179,49 @@ class VideoService:
         Returns:
             是否成功
         """
-        import aiohttp
-        import asyncio
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url) as resp:
-                    if resp.status == 200:
-                        # 确保目录存在
-                        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-                        
-                        # 使用标准库写入文件（在线程中执行）
-                        chunks = []
-                        async for chunk in resp.content.iter_chunked(8192):
-                            chunks.append(chunk)
-                        
-                        # 合并并写入文件
-                        data = b''.join(chunks)
-                        await asyncio.to_thread(self._write_file, output_path, data)
-                        
-                        print(f"✅ 视频已下载: {output_path}")
-                        return True
-                    else:
-                        print(f"❌ 下载失败: HTTP {resp.status}")
-                        return False
+            session = self._get_download_session()
+            async with session.get(video_url) as resp:
+                if resp.status == 200:
+                    # 确保目录存在
+                    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+                    
+                    # 使用标准库写入文件（在线程中执行）
+                    chunks = []
+                    async for chunk in resp.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                        chunks.append(chunk)
+                    
+                    # 合并并写入文件
+                    data = b''.join(chunks)
+                    await asyncio.to_thread(self._write_file, output_path, data)
+                    
+                    print(f"✅ 视频已下载: {output_path}")
+                    return True
+                else:
+                    print(f"❌ 下载失败: HTTP {resp.status}")
+                    return False
         except Exception as e:
             print(f"❌ 下载异常: {e}")
             return False
     
+    async def download_videos(self, pairs: List[Tuple[str, str]]) -> List[bool]:
+        """
+        并发下载多个视频（共享连接池，并发数受 DOWNLOAD_CONCURRENCY 限制）
+        
+        Args:
+            pairs: (视频URL, 本地保存路径) 列表
+        
+        Returns:
+            与 pairs 顺序一致的成功标记列表
+        """
+        semaphore = asyncio.Semaphore(self.DOWNLOAD_CONCURRENCY)
+        
+        async def download_one(video_url: str, output_path: str) -> bool:
+            async with semaphore:
+                return await self.download_video(video_url, output_path)
+        
+        return await asyncio.gather(*(download_one(url, path) for url, path in pairs))
+    
     def _write_file(self, path: str, data: bytes):
         """同步写入文件（在线程中执行）"""
         with open(path, 'wb') as f:
@@ -207,6 +252,7 @@ class VideoService:
     
     async def close(self):
         """清理资源"""
-        await self.default_provider.close()
-        for provider in self.active_tasks.values():
+        if self._download_session and not self._download_session.closed:
+            await self._download_session.close()
+        for provider in self._providers.values():
             await provider.close()
@@ -49,8 +49,13 @@ def get_available_providers() -> list:
 
 def get_provider_capabilities(provider_type: str, config: Dict = None) -> Dict:
     """获取提供商能力信息"""
-    if config and config.get("request_template"):
-        provider = GenericVideoProvider(config)
-    else:
-        provider = create_video_provider(provider_type, config or {})
-    return provider.get_capabilities()
+    config = config or {}
+    # 通用提供商的能力取决于配置中的参数映射，需要实例化
+    if config.get("request_template") or provider_type == "generic":
+        return GenericVideoProvider(config).get_capabilities()
+    
+    if provider_type not in PROVIDER_REGISTRY:
+        raise ValueError(f"未知的视频提供商: {provider_type}")
+    
+    # 内置提供商的能力是静态的，直接从类上读取，不创建实例
+    return PROVIDER_REGISTRY[provider_type].get_capabilities()
@@ -1,11 +1,13 @@
 """
 视频服务多提供商支持
 """
+import asyncio
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any, List
 from enum import Enum
 from datetime import datetime
-from pydantic import BaseModel, Field
+import aiohttp
 
 
 class VideoProviderType(str, Enum):
@@ -29,18 +31,20 @@ class VideoResolution(str, Enum):
     P1080 = "1080p"
 
 
-class VideoGenerationRequest(BaseModel):
-    """统一请求格式"""
+@dataclass
+class VideoGenerationRequest:
+    """统一请求格式（进程内传递，不做校验）"""
     prompt: str
     image_path: Optional[str] = None
     duration: VideoDuration = VideoDuration.SECONDS_4
     resolution: VideoResolution = VideoResolution.P720
     watermark: bool = False
     # 提供商特定参数
-    provider_params: Dict[str, Any] = Field(default_factory=dict)
+    provider_params: Dict[str, Any] = field(default_factory=dict)
 
 
-class VideoGenerationResult(BaseModel):
+@dataclass
+class VideoGenerationResult:
     """统一响应格式"""
     success: bool
     task_id: Optional[str] = None
@@ -49,7 +53,7 @@ class VideoGenerationResult(BaseModel):
     status: str = "submitted"  # submitted/processing/completed/failed
     progress: int = 0
     error_message: Optional[str] = None
-    provider_info: Dict[str, Any] = Field(default_factory=dict)
+    provider_info: Dict[str, Any] = field(default_factory=dict)
 
 
 class BaseVideoProvider(ABC):
@@ -57,11 +61,31 @@ class BaseVideoProvider(ABC):
     
     provider_type: str
     
+    # 跨实例共享的HTTP会话: loop -> {base_url: session}（同一服务端的所有提供商实例共用连接池，
+    # 会话与事件循环绑定，按循环分别保存）
+    _shared_sessions: Dict[asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]] = {}
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.api_key = config.get("api_key")
         self.base_url = config.get("base_url", "")
-        self.session = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环上按 base_url 共享的HTTP会话"""
+        cls = BaseVideoProvider
+        loop = asyncio.get_running_loop()
+        sessions = cls._shared_sessions.get(loop)
+        if sessions is None:
+            # 顺带清理已关闭循环留下的会话，避免字典随循环更替增长
+            for stale in [l for l in cls._shared_sessions if l.is_closed()]:
+                del cls._shared_sessions[stale]
+            sessions = cls._shared_sessions[loop] = {}
+        session = sessions.get(self.base_url)
+        if session is None or session.closed:
+            session = sessions[self.base_url] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, limit_per_host=16)
+            )
+        return session
     
     @abstractmethod
     async def generate_video(
@@ -81,10 +105,31 @@ class BaseVideoProvider(ABC):
     
     @abstractmethod
     def get_capabilities(self) -> Dict[str, Any]:
-        """获取提供商能力"""
+        """获取提供商能力（能力固定的提供商可实现为 classmethod，无需实例即可查询）"""
         pass
     
     async def close(self):
-        """清理资源"""
-        if self.session:
-            await self.session.close()
+        """清理实例资源（共享会话由 shutdown 统一关闭，避免影响其他实例的进行中请求）"""
+        pass
+    
+    @classmethod
+    async def shutdown(cls):
+        """关闭所有事件循环上的共享HTTP会话（进程退出时调用）"""
+        entries, BaseVideoProvider._shared_sessions = BaseVideoProvider._shared_sessions, {}
+        current = asyncio.get_running_loop()
+        for loop, sessions in entries.items():
+            if loop is current:
+                await _close_sessions(sessions.values())
+            elif loop.is_running():
+                # 其他线程中仍在运行的循环：会话只能在其所属循环上关闭
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(_close_sessions(sessions.values()), loop)
+                )
+            # 已关闭的循环无法再驱动关闭流程，连接随传输对象回收时释放
+
+
+async def _close_sessions(sessions) -> None:
+    """关闭一组HTTP会话"""
+    for session in list(sessions):
+        if not session.closed:
+            await session.close()
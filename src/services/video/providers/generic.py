@@ -5,7 +5,7 @@
 import json
 import base64
 import aiohttp
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from pathlib import Path
 
 from .base import (
@@ -23,7 +23,6 @@ class GenericVideoProvider(BaseVideoProvider):
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
-        self.session: Optional[aiohttp.ClientSession] = None
         
         # 解析配置
         self.request_template = config.get("request_template", {})
@@ -49,12 +48,6 @@ class GenericVideoProvider(BaseVideoProvider):
             "generic": True,
         }
     
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建 session"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
-    
     def _image_to_base64(self, image_path: str) -> str:
         """将图片转为 base64"""
         with open(image_path, 'rb') as f:
@@ -312,8 +305,3 @@ class GenericVideoProvider(BaseVideoProvider):
         except Exception as e:
             print(f"❌ 下载异常: {e}")
             return False
-    
-    async def close(self):
-        """关闭资源"""
-        if self.session and not self.session.closed:
-            await self.session.close()
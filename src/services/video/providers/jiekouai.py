@@ -19,10 +19,22 @@ class JiekouaiVideoProvider(BaseVideoProvider):
     
     provider_type = "jiekouai"
     
+    # 接口AI Sora-2 支持: 4, 8, 12 秒；720p, 1080p
+    DURATION_SECONDS: Dict[VideoDuration, int] = {
+        VideoDuration.SECONDS_4: 4,
+        VideoDuration.SECONDS_8: 8,
+        VideoDuration.SECONDS_12: 12,
+    }
+    RESOLUTION_NAMES: Dict[VideoResolution, str] = {
+        VideoResolution.P720: "720p",
+        VideoResolution.P1080: "1080p",
+    }
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
     
-    def get_capabilities(self) -> Dict[str, Any]:
+    @classmethod
+    def get_capabilities(cls) -> Dict[str, Any]:
         from .config import JIEKOUAI_SORA2_CONFIG
         return {
             "supports_image_input": True,
@@ -35,12 +47,6 @@ class JiekouaiVideoProvider(BaseVideoProvider):
             "async_only": True,
         }
     
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建 session"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
-    
     def _image_to_base64(self, image_path: str) -> str:
         """将图片转为 base64"""
         with open(image_path, 'rb') as f:
@@ -48,22 +54,11 @@ class JiekouaiVideoProvider(BaseVideoProvider):
     
     def _normalize_duration(self, duration: VideoDuration) -> int:
         """转换时长到 API 要求的整数值"""
-        # 接口AI Sora-2 支持: 4, 8, 12 秒
-        duration_map = {
-            VideoDuration.SECONDS_4: 4,
-            VideoDuration.SECONDS_8: 8,
-            VideoDuration.SECONDS_12: 12,
-        }
-        return duration_map.get(duration, 4)  # 默认4秒
+        return self.DURATION_SECONDS.get(duration, 4)  # 默认4秒
     
     def _normalize_resolution(self, resolution: VideoResolution) -> str:
         """转换分辨率到 API 要求的格式"""
-        # 接口AI Sora-2 支持: 720p, 1080p
-        resolution_map = {
-            VideoResolution.P720: "720p",
-            VideoResolution.P1080: "1080p",
-        }
-        return resolution_map.get(resolution, "720p")  # 默认720p
+        return self.RESOLUTION_NAMES.get(resolution, "720p")  # 默认720p
     
     async def generate_video(
         self, 
@@ -24,7 +24,8 @@ class MockVideoProvider(BaseVideoProvider):
         super().__init__(config)
         self.simulate_delay = config.get("simulate_delay", 2)  # 模拟延迟秒数
     
-    def get_capabilities(self) -> Dict[str, Any]:
+    @classmethod
+    def get_capabilities(cls) -> Dict[str, Any]:
         return {
             "supports_image_input": True,
             "image_format": "url_or_path",
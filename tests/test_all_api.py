@@ -253,10 +253,10 @@ async def test_image_generation():
             print(f"   🌐 图片URL: {result.get('url', 'N/A')[:50]}...")
             
             # 下载图片
-            await image_service._download_image(result["url"], output_path)
-            if output_path.exists():
-                print(f"   💾 图片已保存: {output_path}")
-                print(f"   📁 文件大小: {output_path.stat().st_size} bytes")
+            actual = await image_service._download_image_with_ext(result["url"], output_path)
+            if actual:
+                print(f"   💾 图片已保存: {actual}")
+                print(f"   📁 文件大小: {actual.stat().st_size} bytes")
             else:
                 print(f"   ⚠️ 图片下载可能失败")
         else:
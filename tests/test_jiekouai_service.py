@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+接口AI图片服务测试
+验证不依赖网络的纯逻辑部分（尺寸映射等）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import random
+
+from PIL import Image
+
+import src.services.jiekouai_service as jiekouai_module
+from src.services.jiekouai_service import JiekouAIImageService
+
+
+def test_map_dims_supported_and_fallback():
+    """支持的尺寸按映射表转换，配置了不支持的尺寸时回退到默认尺寸而不是报错"""
+    print("\n🧪 测试尺寸映射...")
+    assert JiekouAIImageService._map_dims(1280, 720) == ("16x9", "1k")
+    assert JiekouAIImageService._map_dims(1920, 1080) == JiekouAIImageService.DEFAULT_DIM
+    assert JiekouAIImageService._map_size(1920, 1080) == "1x1"
+    print("✅ 尺寸映射正确")
+
+
+def test_keyframe_download_failure_returns_none(monkeypatch, tmp_path):
+    """图片生成成功但下载失败时，首帧生成返回None而不是不存在的目标路径"""
+    print("\n🧪 测试首帧下载失败...")
+    service = JiekouAIImageService(api_key="test")
+
+    async def fake_request_keyframe(prompt, width, height, reference_images):
+        return {"success": True, "url": "https://example.com/frame.png"}
+
+    class FailingSession:
+        def get(self, url, **kwargs):
+            raise ConnectionError("connection refused")
+
+    async def fake_get_session():
+        return FailingSession()
+
+    monkeypatch.setattr(service, "_request_keyframe", fake_request_keyframe)
+    monkeypatch.setattr(service, "_get_session", fake_get_session)
+
+    result = asyncio.run(service.generate_keyframe("教室", tmp_path / "shot_001.png"))
+
+    assert result is None
+    assert not list(tmp_path.iterdir())
+    print("✅ 下载失败返回None")
+
+
+def test_shared_session_per_loop_and_shutdown():
+    """共享会话按事件循环区分：同一循环内复用，新循环清理已关闭循环的会话，shutdown 关闭全部会话"""
+    print("\n🧪 测试共享会话生命周期...")
+    service = JiekouAIImageService(api_key="test")
+
+    async def first_loop():
+        session = await service._get_session()
+        assert await service._get_session() is session
+        return session
+
+    async def second_loop():
+        session = await service._get_session()
+        assert list(JiekouAIImageService._shared_sessions) == [asyncio.get_running_loop()]
+        await JiekouAIImageService.shutdown()
+        return session
+
+    stale = asyncio.run(first_loop())
+    session = asyncio.run(second_loop())
+
+    assert session is not stale
+    assert session.closed
+    assert JiekouAIImageService._shared_sessions == {}
+    print("✅ 共享会话按循环创建并在 shutdown 时关闭")
+
+
+def test_api_semaphore_recreated_per_loop():
+    """生成请求信号量在同一循环内复用，换用新事件循环时重新创建"""
+    service = JiekouAIImageService(api_key="test", max_concurrency=2)
+
+    async def get_twice():
+        semaphore = service._get_api_semaphore()
+        assert service._get_api_semaphore() is semaphore
+        async with semaphore:
+            pass
+        return semaphore
+
+    first = asyncio.run(get_twice())
+    second = asyncio.run(get_twice())
+
+    assert first is not second
+    assert second._value == 2
+
+
+def _noise_image(width: int = 256, height: int = 256) -> Image.Image:
+    """生成带噪声的测试图（纯色图压缩后太小，无法覆盖质量查找）"""
+    rng = random.Random(42)
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.frombytes("RGB", (width, height), bytes(rng.randrange(256) for _ in range(width * height * 3)))
+    return Image.blend(img, noise, 0.3)
+
+
+def test_jpeg_quality_search_matches_brute_force():
+    """体积上限内选出的JPEG质量与逐档穷举的结果一致；上限宽松时直接用最高质量，无解时返回None"""
+    print("\n🧪 测试JPEG质量查找...")
+    img = _noise_image()
+    encode = jiekouai_module._make_jpeg_encoder(img)
+    sizes = {q: len(encode(q)) for q in range(20, 86)}
+
+    for max_kb in (8, 12, 16, 24):
+        result = JiekouAIImageService._encode_jpeg_within_budget(img, max_kb)
+        best = max(q for q, size in sizes.items() if size <= max_kb * 1024)
+        assert len(result) <= max_kb * 1024
+        assert result in (encode(best), encode(best, optimize=True)), max_kb
+
+    assert JiekouAIImageService._encode_jpeg_within_budget(img, 1024) in (encode(85), encode(85, optimize=True))
+    assert JiekouAIImageService._encode_jpeg_within_budget(img, 1) is None
+    print("✅ JPEG质量查找正确")
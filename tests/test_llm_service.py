@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+LLM服务测试
+验证请求消息构建（不实际调用LLM）
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import json
+
+import pytest
+
+import src.services.llm_service as llm_module
+from src.core.config import Config, settings
+from src.services.llm_service import (
+    LLMService, _split_script, render_template, extract_json_text, parse_json_response
+)
+
+
+def _make_service(provider: str = "openai", reply: str = "ok"):
+    """创建LLM服务，路由器调用替换为记录参数的假实现"""
+    service = LLMService(Config.load_global())
+    service.llm_config.provider = provider
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    service._call = fake_acompletion
+    return service, calls
+
+
+def test_anthropic_messages_are_plain_strings():
+    """anthropic 提供商：消息为纯字符串，静态前缀在前，不带 cache_control 和 beta 头"""
+    print("\n🧪 测试 anthropic 请求消息...")
+    service, calls = _make_service("anthropic")
+
+    result = asyncio.run(service.generate(
+        "剧本内容", system_prompt="你是编剧助手", cached_prefix="任务说明\n", max_tokens=512
+    ))
+
+    assert result == "ok"
+    assert calls == [{
+        "messages": [
+            {"role": "system", "content": "你是编剧助手"},
+            {"role": "user", "content": "任务说明\n剧本内容"},
+        ],
+        "max_tokens": 512,
+    }]
+    print("✅ anthropic 消息构建正确")
+
+
+def test_plain_prompt_without_prefix():
+    """无系统提示词和前缀时只发送一条用户消息，不附加未指定的采样参数"""
+    service, calls = _make_service()
+
+    asyncio.run(service.generate("你好"))
+
+    assert calls == [{"messages": [{"role": "user", "content": "你好"}]}]
+
+
+def test_split_script_chunk_boundaries():
+    """切分结果拼接后还原剧本，每段不超过上限，超长单行被硬切"""
+    print("\n🧪 测试剧本切分...")
+    script = "".join(f"第{i}行：小明走进教室，和小红打招呼。\n" for i in range(200))
+    script += "长" * 250 + "\n" + "结尾\n"
+
+    chunks = _split_script(script, 100)
+
+    assert "".join(chunks) == script
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert sum(1 for chunk in chunks if chunk.startswith("长")) == 3
+    assert _split_script("短剧本", 100) == ["短剧本"]
+    print(f"✅ 切分为 {len(chunks)} 段")
+
+
+def test_split_script_local_edit_keeps_other_chunks():
+    """修改剧本中间一行，只影响附近的片段，开头的片段保持不变"""
+    lines = [f"第{i}行：小明走进教室，和小红打招呼。\n" for i in range(200)]
+    chunks = _split_script("".join(lines), 300)
+    edited = list(lines)
+    edited[150] = "第150行：小明离开了教室。\n"
+    edited_chunks = _split_script("".join(edited), 300)
+
+    assert edited_chunks[:len(chunks) // 2] == chunks[:len(chunks) // 2]
+
+
+def test_extract_merges_across_chunks():
+    """分段提取：角色按名字去重并补全描述，未命名角色丢弃，边界两侧同名场景合并，未命名场景不合并"""
+    print("\n🧪 测试分段提取合并...")
+    service, _ = _make_service()
+    service.EXTRACTION_CHUNK_CHARS = 10
+    results = {
+        "片段一片段一\n": (
+            [{"name": "小明", "description": "", "personality": "开朗"}, {"description": "路人"}],
+            [{"name": "教室", "script_segment": "上半场", "characters": ["小明"]}, {"script_segment": "旁白一"}],
+        ),
+        "片段二片段二\n": (
+            [{"name": "小明", "description": "学生"}, {"name": "小红", "description": "同学"}, {"name": ""}],
+            [{"script_segment": "旁白二"}, {"name": "操场", "script_segment": "操场戏", "characters": ["小红"]}],
+        ),
+        "片段三片段三\n": (
+            [],
+            [{"name": "操场", "script_segment": "续", "characters": ["小红", "小明"]}],
+        ),
+    }
+
+    async def fake_extract_chunk(chunk):
+        return results[chunk]
+
+    service._extract_chunk = fake_extract_chunk
+    characters, scenes = asyncio.run(service.extract_characters_and_scenes("".join(results)))
+
+    assert characters == [
+        {"name": "小明", "description": "学生", "personality": "开朗"},
+        {"name": "小红", "description": "同学"},
+    ]
+    assert [s.get("name") for s in scenes] == ["教室", None, None, "操场"]
+    assert scenes[3]["script_segment"] == "操场戏\n续"
+    assert scenes[3]["characters"] == ["小红", "小明"]
+    print("✅ 分段结果合并正确")
+
+
+def test_router_cache_is_bounded_and_closed_on_shutdown(monkeypatch):
+    """路由器按配置哈希缓存：键不含密钥，相同配置复用，超出上限淘汰最久未用的，shutdown 关闭客户端并清空"""
+    print("\n🧪 测试路由器缓存...")
+    closed = []
+
+    class FakeClient:
+        def __init__(self, name):
+            self.name = name
+
+        async def close(self):
+            closed.append(self.name)
+
+    class FakeRouter:
+        def __init__(self, model_list, **kwargs):
+            self.api_key = model_list[0]["litellm_params"]["api_key"]
+            client = FakeClient(self.api_key)
+            self.cache = SimpleNamespace(in_memory_cache=SimpleNamespace(cache_dict={"primary_async_client": client}))
+
+    monkeypatch.setattr(llm_module, "litellm", SimpleNamespace(Router=FakeRouter))
+    monkeypatch.setattr(llm_module, "_ROUTERS", llm_module.OrderedDict())
+    monkeypatch.setattr(llm_module, "ROUTER_CACHE_SIZE", 2)
+
+    service = LLMService(Config.load_global())
+    routers = []
+    for api_key in ("sk-secret-1", "sk-secret-2", "sk-secret-1", "sk-secret-3"):
+        service.api_key = api_key
+        routers.append(service._get_router())
+
+    assert routers[2] is routers[0]
+    assert [r.api_key for r in llm_module._ROUTERS.values()] == ["sk-secret-1", "sk-secret-3"]
+    assert all("sk-secret" not in key for key in llm_module._ROUTERS)
+
+    asyncio.run(LLMService.shutdown())
+
+    assert sorted(closed) == ["sk-secret-1", "sk-secret-3"]
+    assert not llm_module._ROUTERS
+    print("✅ 路由器缓存有界并在 shutdown 时关闭")
+
+
+def test_render_template():
+    """填充已提供的占位符，未提供的原样保留，占位符之外的方括号不受影响"""
+    template = "剧本：[[SCRIPT]]\n风格：[[STYLE]]\n数组：[1, 2]"
+    assert render_template(template, SCRIPT="第一幕") == "剧本：第一幕\n风格：[[STYLE]]\n数组：[1, 2]"
+    assert render_template("[[A]][[A]]", A="x") == "xx"
+    assert render_template("无占位符") == "无占位符"
+
+
+def test_extract_json_text():
+    """优先取 ```json 代码块，其次任意代码块（缺少结尾围栏时取到末尾），再其次花括号范围"""
+    assert extract_json_text('说明\n```json\n{"a": 1}\n```\n其他') == '{"a": 1}'
+    assert extract_json_text('```\n{"a": 2}\n```') == '{"a": 2}'
+    assert extract_json_text('```json\n{"a": 3}') == '{"a": 3}'
+    assert extract_json_text('结果是 {"a": {"b": 4}} 以上') == '{"a": {"b": 4}}'
+    assert extract_json_text("没有JSON") == "没有JSON"
+
+
+def test_parse_json_response():
+    """解析代码块、纯JSON、带前后说明文字（说明中含花括号）的响应，无法解析时抛出 JSONDecodeError"""
+    assert parse_json_response('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json_response('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert parse_json_response('好的：{"a": 1}\n注意 {x} 只是示例}') == {"a": 1}
+    assert parse_json_response("[1, 2]") == [1, 2]
+    with pytest.raises(json.JSONDecodeError):
+        parse_json_response("不是JSON")
+
+
+def test_response_cache_key_and_atomic_write(monkeypatch, tmp_path):
+    """相同请求命中磁盘缓存；提示词或采样参数变化时不命中；校验失败的响应不写缓存；不残留临时文件"""
+    print("\n🧪 测试LLM响应缓存...")
+    monkeypatch.setattr(settings, "llm_response_cache", True)
+    monkeypatch.setattr(llm_module, "LLM_CACHE_DIR", tmp_path / "llm")
+    service, calls = _make_service(reply='{"ok": true}')
+
+    def generate(prompt, **kwargs):
+        return asyncio.run(service.generate_cached(prompt, cached_prefix="前缀\n", **kwargs))
+
+    assert generate("剧本A") == '{"ok": true}'
+    assert generate("剧本A") == '{"ok": true}'
+    assert len(calls) == 1
+
+    generate("剧本B")
+    service.llm_config.temperature = 0.1
+    generate("剧本A")
+    generate("剧本A", response_format={"type": "json_object"})
+    assert len(calls) == 4
+
+    cache_files = list((tmp_path / "llm").iterdir())
+    assert len(cache_files) == 4
+    assert all(f.suffix == ".txt" and len(f.stem) == 64 for f in cache_files)
+
+    generate("剧本C", validate=lambda response: False)
+    generate("剧本C", validate=lambda response: False)
+    assert len(calls) == 6
+    assert len(list((tmp_path / "llm").iterdir())) == 4
+    print("✅ 响应缓存键与写入正确")
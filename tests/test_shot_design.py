@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+分镜设计服务测试
+验证LLM响应缓存开启时，重新设计分镜会重新请求LLM
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import json
+
+import src.services.llm_service as llm_module
+from src.core.config import settings
+from src.models.schemas import Character, Scene, Shot
+from src.services.shot_design_service import ShotDesignService
+
+
+COMBINED_REPLY = json.dumps({
+    "image": {"positive": "教室全景", "negative": "low quality"},
+    "video": "镜头缓慢推进"
+}, ensure_ascii=False)
+
+
+def _make_service(replies):
+    """创建分镜设计服务，LLM调用替换为按顺序返回 replies 并记录调用次数的假实现"""
+    service = ShotDesignService()
+    calls = []
+
+    async def fake_acompletion(messages, **kwargs):
+        calls.append(messages)
+        content = replies[min(len(calls), len(replies)) - 1]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    service.llm_service._call = fake_acompletion
+    return service, calls
+
+
+def _make_shot():
+    scene = Scene(scene_id="scene_001", name="教室", description="明亮的教室", location="学校", time="白天")
+    char = Character(character_id="char_001", name="小明", description="学生", personality="开朗")
+    shot = Shot(shot_id="scene_001_shot_001", scene_id="scene_001", sequence=1, description="小明走进教室")
+    return shot, [char], scene
+
+
+def test_redesign_bypasses_response_cache(monkeypatch, tmp_path):
+    """开启响应缓存时，use_cache=False 的第二次重新设计仍然请求LLM"""
+    print("\n🧪 测试重新设计绕过响应缓存...")
+    monkeypatch.setattr(settings, "llm_response_cache", True)
+    monkeypatch.setattr(llm_module, "LLM_CACHE_DIR", tmp_path)
+
+    service, calls = _make_service([COMBINED_REPLY])
+    shot, characters, scene = _make_shot()
+
+    asyncio.run(service.generate_shot_prompts(shot, characters, scene, "日系动画", use_cache=False))
+    asyncio.run(service.generate_shot_prompts(shot, characters, scene, "日系动画", use_cache=False))
+
+    assert len(calls) == 2
+    assert shot.image_prompt.positive == "教室全景"
+    assert shot.video_prompt.description == "镜头缓慢推进"
+    print("✅ 两次重新设计都请求了LLM")
+
+
+def test_cached_prompts_replay_stored_reply(monkeypatch, tmp_path):
+    """默认 use_cache=True 时，相同输入第二次命中磁盘缓存，不再请求LLM"""
+    print("\n🧪 测试提示词生成命中响应缓存...")
+    monkeypatch.setattr(settings, "llm_response_cache", True)
+    monkeypatch.setattr(llm_module, "LLM_CACHE_DIR", tmp_path)
+
+    service, calls = _make_service([COMBINED_REPLY])
+    shot, characters, scene = _make_shot()
+
+    asyncio.run(service.generate_shot_prompts(shot, characters, scene, "日系动画"))
+    asyncio.run(service.generate_shot_prompts(shot, characters, scene, "日系动画"))
+
+    assert len(calls) == 1
+    assert len(list(tmp_path.glob("*.txt"))) == 1
+    print("✅ 第二次调用命中缓存")
+
+
+def test_estimate_shot_count_boundaries():
+    """分镜数按描述长度区间查表：<50 为2，<150 为3，<300 为4，其余为5"""
+    service = ShotDesignService()
+    for length, expected in [(0, 2), (49, 2), (50, 3), (149, 3), (150, 4), (299, 4), (300, 5), (2000, 5)]:
+        assert service.estimate_shot_count("字" * length) == expected, length
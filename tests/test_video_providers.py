@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+视频提供商基类测试
+验证跨实例共享HTTP会话的生命周期（不发起网络请求）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+
+from src.services.video.providers import BaseVideoProvider, MockVideoProvider
+
+
+def test_shared_sessions_per_loop_and_shutdown():
+    """共享会话按事件循环和 base_url 区分，新循环清理已关闭循环的会话，shutdown 关闭全部会话"""
+    print("\n🧪 测试视频提供商共享会话...")
+    a = MockVideoProvider({"base_url": "https://a.example.com"})
+    b = MockVideoProvider({"base_url": "https://b.example.com"})
+
+    async def first_loop():
+        return await a._get_session()
+
+    async def second_loop():
+        session_a = await a._get_session()
+        assert await MockVideoProvider({"base_url": "https://a.example.com"})._get_session() is session_a
+        session_b = await b._get_session()
+        assert session_b is not session_a
+        assert list(BaseVideoProvider._shared_sessions) == [asyncio.get_running_loop()]
+        await BaseVideoProvider.shutdown()
+        return session_a, session_b
+
+    stale = asyncio.run(first_loop())
+    session_a, session_b = asyncio.run(second_loop())
+
+    assert session_a is not stale
+    assert session_a.closed and session_b.closed
+    assert BaseVideoProvider._shared_sessions == {}
+    print("✅ 共享会话按循环创建并在 shutdown 时关闭")